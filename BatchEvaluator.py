@@ -0,0 +1,190 @@
+import numpy as np
+
+from Board import (
+    BOTTOM_ROW_MASK,
+    EDGES_MASK,
+    EVALUATION_WEIGHTS,
+    FULL_MASK,
+    MIDDLE_BOX_MASK,
+    MIDDLE_ROWS_MASK,
+    SQUARES,
+    TOP_ROW_MASK,
+    Board,
+    shift_down_left,
+    shift_down_right,
+    shift_up_left,
+    shift_up_right,
+)
+from Constants import *
+
+# Same evaluation as Board.evaluate, but for a whole array of positions
+# at once. Positions are given as three uint32 arrays of bitboards
+# (white, black and queens) or as an (N, 32) array of piece types.
+
+# Number of positions evaluated together:
+BATCH_CHUNK = 8192
+
+_BITS = np.left_shift(np.uint32(1), np.arange(SQUARES, dtype=np.uint32))
+_DOUBLED_WEIGHTS = [np.int16(2 * weight) for weight in EVALUATION_WEIGHTS]
+
+# Complements are taken here, NumPy won't mix negative ints with uint32:
+_NOT_TOP_ROW = np.uint32(FULL_MASK & ~TOP_ROW_MASK)
+_NOT_BOTTOM_ROW = np.uint32(FULL_MASK & ~BOTTOM_ROW_MASK)
+_NOT_EDGES = np.uint32(FULL_MASK & ~EDGES_MASK)
+_EDGES = np.uint32(EDGES_MASK)
+_TOP_ROW = np.uint32(TOP_ROW_MASK)
+_BOTTOM_ROW = np.uint32(BOTTOM_ROW_MASK)
+_MIDDLE_BOX = np.uint32(MIDDLE_BOX_MASK)
+_MIDDLE_ROWS = np.uint32(MIDDLE_ROWS_MASK)
+_FULL = np.uint32(FULL_MASK)
+
+# Bits set in every byte value, for NumPy versions without bitwise_count:
+_BYTE_COUNTS = np.array([bin(byte).count("1") for byte in range(256)], np.int16)
+
+
+def popcount(bitboards: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitboards)
+    as_bytes = bitboards.astype(np.uint32).view(np.uint8)
+    return _BYTE_COUNTS[as_bytes].reshape(-1, 4).sum(axis=1, dtype=np.int16)
+
+
+def boards_to_bitboards(boards: list[Board]) -> tuple[np.ndarray, ...]:
+    white = np.fromiter((board.white for board in boards), np.uint32, len(boards))
+    black = np.fromiter((board.black for board in boards), np.uint32, len(boards))
+    queens = np.fromiter((board.queens for board in boards), np.uint32, len(boards))
+    return white, black, queens
+
+
+def squares_to_bitboards(squares: np.ndarray) -> tuple[np.ndarray, ...]:
+    # Every row holds piece types of the 32 dark squares, in board order:
+    squares = np.asarray(squares)
+    if squares.ndim != 2 or squares.shape[1] != SQUARES:
+        raise ValueError(f"Positions must have shape (N, {SQUARES}): {squares.shape}")
+
+    def bitboard(present: np.ndarray) -> np.ndarray:
+        return np.bitwise_or.reduce(np.where(present, _BITS, np.uint32(0)), axis=1)
+
+    return (
+        bitboard(squares & WHITE_COLOR != 0),
+        bitboard(squares & BLACK_COLOR != 0),
+        bitboard(squares & QUEEN != 0),
+    )
+
+
+def _criterium_masks(
+    white: np.ndarray, black: np.ndarray, queens: np.ndarray
+) -> tuple[list, list]:
+    # For white and black, masks of every criterium in the order
+    # of EVALUATION_WEIGHTS, popcounts of a tuple add up to its value:
+    empty = ~(white | black) & _FULL
+    white_queens = white & queens
+    black_queens = black & queens
+    # Pieces in the back row count only as back row and protected:
+    white_back = white & _BOTTOM_ROW
+    black_back = black & _TOP_ROW
+    white_rest = white & _NOT_BOTTOM_ROW
+    black_rest = black & _NOT_TOP_ROW
+    white_inner = white_rest & _NOT_TOP_ROW & _NOT_EDGES
+    black_inner = black_rest & _NOT_BOTTOM_ROW & _NOT_EDGES
+
+    whites = [
+        (white & ~queens,),
+        (white_queens,),
+        (white_back,),
+        (white_rest & _MIDDLE_BOX,),
+        (white_rest & _MIDDLE_ROWS,),
+        (
+            white_inner & shift_down_right(black) & shift_up_left(empty),
+            white_inner & shift_down_left(black) & shift_up_right(empty),
+        ),
+        (
+            white_back,
+            white_rest & _EDGES,
+            white_rest
+            & _NOT_EDGES
+            & ~shift_up_right(black_queens)
+            & ~shift_up_left(black_queens),
+        ),
+    ]
+    blacks = [
+        (black & ~queens,),
+        (black_queens,),
+        (black_back,),
+        (black_rest & _MIDDLE_BOX,),
+        (black_rest & _MIDDLE_ROWS,),
+        (
+            black_inner & shift_up_right(white) & shift_down_left(empty),
+            black_inner & shift_up_left(white) & shift_down_right(empty),
+        ),
+        (
+            black_back,
+            black_rest & _EDGES,
+            black_rest
+            & _NOT_EDGES
+            & ~shift_down_right(white_queens)
+            & ~shift_down_left(white_queens),
+        ),
+    ]
+    return whites, blacks
+
+
+def evaluate_features(
+    white: np.ndarray, black: np.ndarray, queens: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    # Returns (N, 7) arrays of the seven criteriums for white and black:
+    white = np.asarray(white, dtype=np.uint32)
+    black = np.asarray(black, dtype=np.uint32)
+    queens = np.asarray(queens, dtype=np.uint32)
+    white_masks, black_masks = _criterium_masks(white, black, queens)
+    whites = np.zeros((len(white), 7), dtype=np.int64)
+    blacks = np.zeros((len(black), 7), dtype=np.int64)
+    for i in range(7):
+        for mask in white_masks[i]:
+            whites[:, i] += popcount(mask)
+        for mask in black_masks[i]:
+            blacks[:, i] += popcount(mask)
+    return whites, blacks
+
+
+def evaluate_batch(
+    white: np.ndarray, black: np.ndarray, queens: np.ndarray
+) -> np.ndarray:
+    white = np.asarray(white, dtype=np.uint32)
+    black = np.asarray(black, dtype=np.uint32)
+    queens = np.asarray(queens, dtype=np.uint32)
+    # Temporary arrays of a small chunk stay in the CPU cache:
+    scores = np.empty(len(white), dtype=np.float64)
+    for start in range(0, len(white), BATCH_CHUNK):
+        chunk = slice(start, start + BATCH_CHUNK)
+        scores[chunk] = _evaluate_chunk(white[chunk], black[chunk], queens[chunk])
+    return scores
+
+
+def _evaluate_chunk(
+    white: np.ndarray, black: np.ndarray, queens: np.ndarray
+) -> np.ndarray:
+    white_masks, black_masks = _criterium_masks(white, black, queens)
+
+    # Weights are halves, so the sum is kept in doubled small integers,
+    # which is both faster and exact just like the floats in Board:
+    doubled = np.zeros(len(white), dtype=np.int16)
+    for i, weight in enumerate(_DOUBLED_WEIGHTS):
+        for mask in black_masks[i]:
+            doubled += popcount(mask) * weight
+        for mask in white_masks[i]:
+            doubled -= popcount(mask) * weight
+    scores = doubled * 0.5
+
+    # Victory states, checked in the same order as in Board.evaluate:
+    scores[black == 0] = float("-inf")
+    scores[white == 0] = float("inf")
+    return scores
+
+
+def evaluate_boards(boards: list[Board]) -> np.ndarray:
+    return evaluate_batch(*boards_to_bitboards(boards))
+
+
+def evaluate_squares(squares: np.ndarray) -> np.ndarray:
+    return evaluate_batch(*squares_to_bitboards(squares))
@@ -0,0 +1,396 @@
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+from Board import Board
+from Constants import *
+from Engine import Engine
+from ParallelEngine import ParallelEngine
+from Tablebase import Tablebase
+
+# Depth every position is searched to, unless given on the command line:
+BENCHMARK_DEPTH = 8
+# Parallel search is compared with the serial one on a shallower search
+# of the benchmark positions and of positions from random games:
+PARALLEL_CHECK_DEPTH = 5
+PARALLEL_CHECK_GAMES = 80
+
+# Positions are written as diagrams, in the same format as str(board),
+# together with the side to move and the forced jumping rule:
+BENCHMARK_POSITIONS = {
+    "start": (
+        """
+        .b.b.b.b
+        b.b.b.b.
+        .b.b.b.b
+        ........
+        ........
+        w.w.w.w.
+        .w.w.w.w
+        w.w.w.w.
+        """,
+        WHITE_COLOR,
+        False,
+    ),
+    "middlegame_break": (
+        """
+        .b.b.b.b
+        b.w...b.
+        .......b
+        b.b...b.
+        ...w....
+        w...w...
+        .w.w.w.w
+        w.w.w...
+        """,
+        WHITE_COLOR,
+        False,
+    ),
+    "middlegame_center": (
+        """
+        .b.....b
+        b.b.b...
+        .b.b.w.b
+        ....w.b.
+        .......w
+        b.w.....
+        ...w.w.w
+        w.w.w...
+        """,
+        WHITE_COLOR,
+        False,
+    ),
+    "middlegame_queen": (
+        """
+        ...b...b
+        b.w.b.b.
+        .b.....b
+        b.......
+        .w...w.w
+        w.....w.
+        .w......
+        w.w...B.
+        """,
+        WHITE_COLOR,
+        False,
+    ),
+    "middlegame_forced": (
+        """
+        ...b...b
+        b.w.b.b.
+        .b.....b
+        b.......
+        .w...w.w
+        w.....w.
+        .w......
+        w.w...B.
+        """,
+        WHITE_COLOR,
+        True,
+    ),
+    "endgame_race": (
+        """
+        .b.....b
+        ..b.b.w.
+        .....b..
+        w.w...B.
+        .....b.b
+        b.....w.
+        .w......
+        w.......
+        """,
+        WHITE_COLOR,
+        False,
+    ),
+    "endgame_queens": (
+        """
+        .......b
+        ....W.b.
+        ...w...b
+        ........
+        .w.b...b
+        ....w.w.
+        .B.w.w.w
+        B.......
+        """,
+        BLACK_COLOR,
+        False,
+    ),
+    "endgame_few": (
+        """
+        ........
+        w.....W.
+        .....w..
+        ........
+        ...b.b..
+        w.......
+        .B.....w
+        w...B...
+        """,
+        BLACK_COLOR,
+        True,
+    ),
+}
+
+
+def create_board(position_name: str) -> Board:
+    position, turn_color, _ = BENCHMARK_POSITIONS[position_name]
+    return Board.from_position(position, turn_color)
+
+
+def benchmark_position(engine: Engine, position_name: str, depth: int) -> dict:
+    _, turn_color, forced_jumping = BENCHMARK_POSITIONS[position_name]
+    board = create_board(position_name)
+    # Every position starts with an empty table, so runs are reproducible:
+    engine.new_game()
+    result = engine.search(
+        board, turn_color, forced_jumping, time_budget=float("inf"), max_depth=depth
+    )
+    return {
+        "move": str(result.move),
+        # Won and lost values are infinite, which JSON has no number for:
+        "value": result.value if math.isfinite(result.value) else str(result.value),
+        "depth": result.depth,
+        "nodes": result.nodes,
+        "elapsed_time": result.elapsed_time,
+        "nodes_per_second": result.nodes_per_second,
+        "depth_times": result.depth_times,
+        "hit_rate": result.table_stats["hit_rate"],
+        "cutoff_on_first_move": result.cutoff_on_first_move,
+    }
+
+
+def run(position_names: list[str], depth: int, tablebases: str = None) -> dict:
+    # Endgame tables change the nodes and moves, so they are only used
+    # when asked for and the run records it:
+    engine = Engine(tablebase=Tablebase(tablebases))
+    positions = {}
+    for position_name in position_names:
+        record = benchmark_position(engine, position_name, depth)
+        positions[position_name] = record
+        print(
+            f"{position_name}: {record['move']} (value {record['value']}) "
+            f"depth {record['depth']}, {record['nodes']} nodes in "
+            f"{record['elapsed_time']:.3f}s ({record['nodes_per_second']:.0f} "
+            f"nodes/s), hit rate {100 * record['hit_rate']:.1f}%"
+        )
+    table_count = len(engine.tablebase)
+    engine.close()
+
+    nodes = sum(record["nodes"] for record in positions.values())
+    elapsed_time = sum(record["elapsed_time"] for record in positions.values())
+    print(f"total: {nodes} nodes in {elapsed_time:.3f}s")
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "depth": depth,
+        "tablebases": table_count,
+        "positions": positions,
+        "nodes": nodes,
+        "elapsed_time": elapsed_time,
+    }
+
+
+def random_positions(count: int, seed: int = 0) -> list[tuple[Board, int, bool]]:
+    # Positions after a random number of random moves, every second one
+    # with forced jumping. Positions with a single move need no search:
+    generator = random.Random(seed)
+    positions = []
+    for game in range(count):
+        board = Board()
+        forced_jumping = game % 2 == 1
+        for _ in range(generator.randint(0, 40)):
+            moves = board.calculate_all_turn_moves(board.turn_color, forced_jumping)
+            if not moves:
+                break
+            board.make_move(generator.choice(moves))
+        moves = board.calculate_all_turn_moves(board.turn_color, forced_jumping)
+        if len(moves) > 1:
+            positions.append((board.copy(), board.turn_color, forced_jumping))
+    return positions
+
+
+def check_parallel(
+    depth: int, games: int, workers: int, tablebases: str = None
+) -> bool:
+    # Both searches must find the same move with the same value,
+    # ties included. Returns False if any position differs:
+    positions = [
+        (create_board(name), turn_color, forced_jumping)
+        for name, (_, turn_color, forced_jumping) in BENCHMARK_POSITIONS.items()
+    ]
+    positions += random_positions(games)
+    serial = Engine(tablebase=Tablebase(tablebases))
+    parallel = ParallelEngine(workers, tablebase_directory=tablebases)
+    differences = 0
+    for board, turn_color, forced_jumping in positions:
+        results = []
+        for engine in (serial, parallel):
+            engine.new_game()
+            results.append(
+                engine.search(
+                    board.copy(),
+                    turn_color,
+                    forced_jumping,
+                    time_budget=float("inf"),
+                    max_depth=depth,
+                )
+            )
+        serial_result, parallel_result = results
+        if (
+            serial_result.move != parallel_result.move
+            or serial_result.value != parallel_result.value
+        ):
+            differences += 1
+            print(board)
+            print(f"  serial: {serial_result}\n  parallel: {parallel_result}")
+    serial.close()
+    parallel.close()
+    print(f"{differences} of {len(positions)} positions differ at depth {depth}")
+    return differences == 0
+
+
+def _change(old: float, new: float) -> str:
+    if old == 0:
+        return "n/a"
+    return f"{100 * (new - old) / old:+.1f}%"
+
+
+def compare(old_run: dict, new_run: dict, threshold: float) -> bool:
+    # Prints the differences and returns False if the new run is slower
+    # than the old one by more than the threshold (in percent):
+    if old_run["depth"] != new_run["depth"]:
+        print(f"Runs were searched to depth {old_run['depth']} and {new_run['depth']}!")
+    if old_run.get("tablebases", 0) != new_run.get("tablebases", 0):
+        print(
+            f"Runs used {old_run.get('tablebases', 0)} and "
+            f"{new_run.get('tablebases', 0)} endgame tables!"
+        )
+    old_positions, new_positions = old_run["positions"], new_run["positions"]
+    for position_name, new in new_positions.items():
+        old = old_positions.get(position_name)
+        if old is None:
+            print(f"{position_name}: only in the new run")
+            continue
+        print(
+            f"{position_name}: nodes {old['nodes']} -> {new['nodes']} "
+            f"({_change(old['nodes'], new['nodes'])}), time "
+            f"{old['elapsed_time']:.3f}s -> {new['elapsed_time']:.3f}s "
+            f"({_change(old['elapsed_time'], new['elapsed_time'])}), nodes/s "
+            f"{_change(old['nodes_per_second'], new['nodes_per_second'])}"
+        )
+        # Different move or value means the search itself has changed:
+        if old["move"] != new["move"] or old["value"] != new["value"]:
+            print(
+                f"  result changed: {old['move']} (value {old['value']}) -> "
+                f"{new['move']} (value {new['value']})"
+            )
+    for position_name in old_positions:
+        if position_name not in new_positions:
+            print(f"{position_name}: only in the old run")
+
+    # Totals only count the positions both runs have:
+    common = [name for name in new_positions if name in old_positions]
+    old_time = sum(old_positions[name]["elapsed_time"] for name in common)
+    new_time = sum(new_positions[name]["elapsed_time"] for name in common)
+    old_nodes = sum(old_positions[name]["nodes"] for name in common)
+    new_nodes = sum(new_positions[name]["nodes"] for name in common)
+    print(
+        f"total: nodes {old_nodes} -> {new_nodes} ({_change(old_nodes, new_nodes)}), "
+        f"time {old_time:.3f}s -> {new_time:.3f}s ({_change(old_time, new_time)})"
+    )
+    return old_time == 0 or 100 * (new_time - old_time) / old_time <= threshold
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Searches a fixed set of positions to measure the engine."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="search the positions")
+    run_parser.add_argument(
+        "positions",
+        nargs="*",
+        help=f"positions to search: {', '.join(BENCHMARK_POSITIONS)} (default: all)",
+    )
+    run_parser.add_argument(
+        "-d",
+        "--depth",
+        type=int,
+        default=BENCHMARK_DEPTH,
+        help=f"search depth (default: {BENCHMARK_DEPTH})",
+    )
+    run_parser.add_argument("-o", "--output", help="JSON file to write the results to")
+    run_parser.add_argument(
+        "-b",
+        "--tablebases",
+        help="directory with endgame tables to use (default: none)",
+    )
+
+    compare_parser = commands.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("old", help="JSON file of the earlier run")
+    compare_parser.add_argument("new", help="JSON file of the later run")
+    compare_parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="slowdown in percent that counts as a regression (default: 10)",
+    )
+    parallel_parser = commands.add_parser(
+        "parallel", help="check that parallel search finds the serial moves"
+    )
+    parallel_parser.add_argument(
+        "-d",
+        "--depth",
+        type=int,
+        default=PARALLEL_CHECK_DEPTH,
+        help=f"search depth (default: {PARALLEL_CHECK_DEPTH})",
+    )
+    parallel_parser.add_argument(
+        "-g",
+        "--games",
+        type=int,
+        default=PARALLEL_CHECK_GAMES,
+        help=f"random games to take positions from (default: {PARALLEL_CHECK_GAMES})",
+    )
+    parallel_parser.add_argument(
+        "-w", "--workers", type=int, default=0, help="worker processes (default: all)"
+    )
+    parallel_parser.add_argument(
+        "-b",
+        "--tablebases",
+        help="directory with endgame tables to use (default: none)",
+    )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        for position_name in args.positions:
+            if position_name not in BENCHMARK_POSITIONS:
+                run_parser.error(f"unknown position: {position_name}")
+        results = run(
+            args.positions or list(BENCHMARK_POSITIONS), args.depth, args.tablebases
+        )
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(results, file, indent=4, allow_nan=False)
+    elif args.command == "parallel":
+        if not check_parallel(args.depth, args.games, args.workers, args.tablebases):
+            sys.exit(1)
+    else:
+        with open(args.old) as file:
+            old_run = json.load(file)
+        with open(args.new) as file:
+            new_run = json.load(file)
+        if not compare(old_run, new_run, args.threshold):
+            print("New run is slower than the threshold allows!")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,433 +1,714 @@
+import random
+
 from Constants import *
 from Move import Move
 from Piece import Piece
 
+### Bitboard layout ###
+# Only the 32 dark tiles are playable, so the whole position fits into three
+# 32-bit masks (white pieces, black pieces and queens of both colors).
+# Square number grows row by row, four squares in each row:
+#   row 0:  .  0  .  1  .  2  .  3
+#   row 1:  4  .  5  .  6  .  7  .
+#   ...
+SQUARES = 32
+FULL_MASK = (1 << SQUARES) - 1
+
+SQUARE_TO_TILE = [0] * SQUARES
+TILE_TO_SQUARE = [-1] * (ROWS * COLS)
+for _square in range(SQUARES):
+    _row = _square // 4
+    _col = 2 * (_square % 4) + (1 if _row % 2 == 0 else 0)
+    SQUARE_TO_TILE[_square] = _row * COLS + _col
+    TILE_TO_SQUARE[_row * COLS + _col] = _square
+
+
+def _mask_of(predicate) -> int:
+    mask = 0
+    for square in range(SQUARES):
+        tile = SQUARE_TO_TILE[square]
+        if predicate(tile // COLS, tile % COLS):
+            mask |= 1 << square
+    return mask
+
+
+EVEN_ROWS_MASK = _mask_of(lambda row, col: row % 2 == 0)
+ODD_ROWS_MASK = _mask_of(lambda row, col: row % 2 == 1)
+LEFT_EDGE_MASK = _mask_of(lambda row, col: col == LEFT_BORDER)
+RIGHT_EDGE_MASK = _mask_of(lambda row, col: col == RIGHT_BORDER)
+EDGES_MASK = LEFT_EDGE_MASK | RIGHT_EDGE_MASK
+TOP_ROW_MASK = _mask_of(lambda row, col: row == TOP_BORDER)
+BOTTOM_ROW_MASK = _mask_of(lambda row, col: row == BOTTOM_BORDER)
+MIDDLE_BOX_MASK = _mask_of(lambda row, col: row in (3, 4) and 2 <= col <= 5)
+MIDDLE_ROWS_MASK = _mask_of(lambda row, col: row in (3, 4)) & ~MIDDLE_BOX_MASK
+BLACK_START_MASK = _mask_of(lambda row, col: row <= 2)
+WHITE_START_MASK = _mask_of(lambda row, col: row >= 5)
+
+# Even rows start on the second column and odd rows on the first one,
+# so the shift for the same diagonal depends on the row parity:
+_EVEN_NOT_RIGHT = EVEN_ROWS_MASK & ~RIGHT_EDGE_MASK
+_ODD_NOT_LEFT = ODD_ROWS_MASK & ~LEFT_EDGE_MASK
+
+
+def shift_up_left(bb: int) -> int:
+    return (bb & EVEN_ROWS_MASK) >> 4 | (bb & _ODD_NOT_LEFT) >> 5
+
+
+def shift_up_right(bb: int) -> int:
+    return (bb & _EVEN_NOT_RIGHT) >> 3 | (bb & ODD_ROWS_MASK) >> 4
+
+
+def shift_down_left(bb: int) -> int:
+    return ((bb & EVEN_ROWS_MASK) << 4 | (bb & _ODD_NOT_LEFT) << 3) & FULL_MASK
+
+
+def shift_down_right(bb: int) -> int:
+    return ((bb & _EVEN_NOT_RIGHT) << 5 | (bb & ODD_ROWS_MASK) << 4) & FULL_MASK
+
+
+# Directions are pairs of (shift, reverse shift):
+UP_DIRECTIONS = (
+    (shift_up_left, shift_down_right),
+    (shift_up_right, shift_down_left),
+)
+DOWN_DIRECTIONS = (
+    (shift_down_left, shift_up_right),
+    (shift_down_right, shift_up_left),
+)
+ALL_DIRECTIONS = UP_DIRECTIONS + DOWN_DIRECTIONS
+
+
+def _jump_table(directions: tuple) -> dict[int, tuple[tuple[int, int], ...]]:
+    # For every square, pairs of (jumped over bit, landing bit) in the given
+    # directions, jumps that would leave the board are left out:
+    table = {}
+    for square in range(SQUARES):
+        bit = 1 << square
+        table[bit] = tuple(
+            (shift(bit), shift(shift(bit)))
+            for shift, _ in directions
+            if shift(shift(bit))
+        )
+    return table
+
+
+def _step_table(directions: tuple) -> dict[int, int]:
+    # For every square, mask of the neighbouring squares in the given directions:
+    table = {}
+    for square in range(SQUARES):
+        bit = 1 << square
+        table[bit] = 0
+        for shift, _ in directions:
+            table[bit] |= shift(bit)
+    return table
+
+
+UP_STEPS = _step_table(UP_DIRECTIONS)
+DOWN_STEPS = _step_table(DOWN_DIRECTIONS)
+ALL_STEPS = _step_table(ALL_DIRECTIONS)
+UP_JUMPS = _jump_table(UP_DIRECTIONS)
+DOWN_JUMPS = _jump_table(DOWN_DIRECTIONS)
+ALL_JUMPS = _jump_table(ALL_DIRECTIONS)
+
+
+BIT_TO_TILE = {1 << square: tile for square, tile in enumerate(SQUARE_TO_TILE)}
+TILE_TO_BIT = {tile: bit for bit, tile in BIT_TO_TILE.items()}
+
+### Zobrist hashing ###
+# Fixed seed, so the same position gets the same key in every process:
+_zobrist_random = random.Random(0x636865636B657273)
+ZOBRIST_PIECES = [
+    {bit: _zobrist_random.getrandbits(64) for bit in BIT_TO_TILE}
+    for _ in range(max(WHITE_QUEEN, BLACK_QUEEN) + 1)
+]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+### Evaluation ###
+# There are 7 criteriums for good heuristics...
+# index 0: number of regular pieces
+# index 1: number of queens
+# index 2: number of pieces in back row
+# index 3: number of pieces in middle box
+# index 4: number of pieces in middle 2 rows, but not in box
+# index 5: number of pieces that can be taken this turn
+# index 6: number of pieces that are protected
+# Every criteria has more or less impact on the game
+# so we need to 'weight' them:
+EVALUATION_WEIGHTS = (5, 7.5, 4, 2.5, 0.5, -3, 3)
+
+
+def _placement_score(piece_type: int, bit: int) -> float:
+    # Part of the score that depends only on the piece and its own square,
+    # from black's point of view like the whole evaluation:
+    weights = EVALUATION_WEIGHTS
+    score = weights[1] if piece_type & QUEEN else weights[0]
+    back_row = BOTTOM_ROW_MASK if piece_type & WHITE_COLOR else TOP_ROW_MASK
+    # Pieces in the back row count only as back row and protected:
+    if bit & back_row:
+        score += weights[2] + weights[6]
+    else:
+        if bit & MIDDLE_BOX_MASK:
+            score += weights[3]
+        elif bit & MIDDLE_ROWS_MASK:
+            score += weights[4]
+        # Pieces on the edges are always protected:
+        if bit & EDGES_MASK:
+            score += weights[6]
+    return -score if piece_type & WHITE_COLOR else score
+
+
+PLACEMENT_SCORES = [
+    {bit: _placement_score(piece_type, bit) for bit in BIT_TO_TILE}
+    for piece_type in range(max(WHITE_QUEEN, BLACK_QUEEN) + 1)
+]
+
+
+def iterate_bits(bb: int):
+    while bb:
+        bit = bb & -bb
+        yield bit
+        bb ^= bit
+
 
 class Board(object):
     def __init__(self):
-        self._board: list[Piece] = []
-        self._whites_left: int = 12
-        self._blacks_left: int = 12
-        self._white_queens: int = 0
-        self._black_queens: int = 0
+        self._white: int = 0
+        self._black: int = 0
+        self._queens: int = 0
+        self._turn_color: int = WHITE_COLOR
+        # Zobrist key of the position, including the side to move:
+        self._hash: int = 0
+        # Sum of PLACEMENT_SCORES of all pieces, kept up to date like the key:
+        self._placement: float = 0
+        # State before every made move, so undo is a single pop:
+        self._history: list[tuple[int, int, int, int, int, float]] = []
 
         self.create_new_board()
 
     @property
-    def board(self):
-        return self._board
+    def board(self) -> list[Piece]:
+        return [self.get_piece(tile_number) for tile_number in range(ROWS * COLS)]
 
     @board.setter
     def board(self, board: list):
-        self._board = board
+        self._white = self._black = self._queens = 0
+        for piece in board:
+            if piece.is_empty():
+                continue
+            bit = TILE_TO_BIT[piece.row * COLS + piece.col]
+            if piece.is_white():
+                self._white |= bit
+            else:
+                self._black |= bit
+            if piece.is_queen():
+                self._queens |= bit
+        self._history = []
+        self._hash = self.compute_hash()
+        self._placement = self.compute_placement()
+
+    def copy(self) -> "Board":
+        # Same position without the move history:
+        board = Board.__new__(Board)
+        board._white = self._white
+        board._black = self._black
+        board._queens = self._queens
+        board._turn_color = self._turn_color
+        board._hash = self._hash
+        board._placement = self._placement
+        board._history = []
+        return board
+
+    def snapshot(self) -> tuple[int, int, int, int, int, float]:
+        # Whole position is a few numbers, so saving it is a single tuple:
+        return (
+            self._white,
+            self._black,
+            self._queens,
+            self._turn_color,
+            self._hash,
+            self._placement,
+        )
 
-    def is_game_over(self):
-        return self._blacks_left == 0 or self._whites_left == 0
+    def restore(self, snapshot: tuple[int, int, int, int, int, float]) -> None:
+        (
+            self._white,
+            self._black,
+            self._queens,
+            self._turn_color,
+            self._hash,
+            self._placement,
+        ) = snapshot
 
-    def evaluate(self):
-        # If I'm not mistaken this is the order of scoring
-        # for victory state of the board, depending on color:
-        if self._whites_left <= 0:
-            return float("inf")
-        elif self._blacks_left <= 0:
-            return float("-inf")
+    @property
+    def squares(self) -> bytearray:
+        # Piece types of the 32 dark squares, in board order:
+        squares = bytearray(SQUARES)
+        for bit in iterate_bits(self._white | self._black):
+            squares[bit.bit_length() - 1] = self._get_bit_type(bit)
+        return squares
 
-        # There are 7 criteriums for good heuristics...
-        # index 0: number of regular pieces
-        # index 1: number of queens
-        # index 2: number of pieces in back row
-        # index 3: number of pieces in middle box
-        # index 4: number of pieces in middle 2 rows, but not in box
-        # index 5: number of pieces that can be taken this turn
-        # index 6: number of pieces that are protected:
-        whites = [0, 0, 0, 0, 0, 0, 0]
-        blacks = [0, 0, 0, 0, 0, 0, 0]
-
-        whites[0] = self._whites_left - self._white_queens
-        blacks[0] = self._blacks_left - self._black_queens
-
-        whites[1] = self._white_queens
-        blacks[1] = self._black_queens
-
-        # Now lookup every piece on the board:
-        for tile_number in range(ROWS * COLS):
-            # row, col are used for transforming 1D to 2D:
-            row = tile_number // COLS
-            col = tile_number % COLS
-
-            # We skip white tiles:
-            if (row + col) % 2 == 0:
-                continue
+    @property
+    def white(self) -> int:
+        return self._white
 
-            # Current piece:
-            piece = self.get_piece(tile_number)
-            if piece.is_empty():
-                continue
+    @property
+    def black(self) -> int:
+        return self._black
 
-            if piece.is_white():
-                # Now back rows:
-                if row == BOTTOM_BORDER:
-                    whites[2] += 1
-                    whites[6] += 1
-                    continue
+    @property
+    def queens(self) -> int:
+        return self._queens
 
-                # Middle area of the board:
-                if row == 3 or row == 4:
-                    # Checking for middle box:
-                    if 2 <= col <= 5:
-                        whites[3] += 1
-                    else:
-                        whites[4] += 1
-
-                # Checking for pieces that can be taken this turn:
-                if row > TOP_BORDER and LEFT_BORDER < col < RIGHT_BORDER:
-                    if (
-                        self.get_piece((row - 1) * COLS + col - 1).is_black()
-                        and self.get_piece((row + 1) * COLS + col + 1).is_empty()
-                    ):
-                        whites[5] += 1
-                    if (
-                        self.get_piece((row - 1) * COLS + col + 1).is_black()
-                        and self.get_piece((row + 1) * COLS + col - 1).is_empty()
-                    ):
-                        whites[5] += 1
-
-                # Checking for protected pieces:
-                if row < BOTTOM_BORDER:
-                    if col == LEFT_BORDER or col == RIGHT_BORDER:
-                        whites[6] += 1
-                    elif (
-                        self.get_piece((row + 1) * COLS + col - 1).is_white()
-                        or not self.get_piece((row + 1) * COLS + col - 1).is_queen()
-                    ) and (
-                        self.get_piece((row + 1) * COLS + col + 1).is_white()
-                        or not self.get_piece((row + 1) * COLS + col + 1).is_queen()
-                    ):
-                        whites[6] += 1
-            else:
+    @property
+    def turn_color(self) -> int:
+        return self._turn_color
 
-                # This time top side:
-                if row == TOP_BORDER:
-                    blacks[2] += 1
-                    blacks[6] += 1
-                    continue
+    @turn_color.setter
+    def turn_color(self, turn: int) -> None:
+        if turn != self._turn_color:
+            self._hash ^= ZOBRIST_BLACK_TO_MOVE
+        self._turn_color = turn
 
-                # Middle area...
-                if row == 3 or row == 4:
-                    # Box in the middle:
-                    if 2 <= col <= 5:
-                        blacks[3] += 1
-                    else:
-                        blacks[4] += 1
-
-                # Pieces that can be eaten:
-                if row < BOTTOM_BORDER and LEFT_BORDER < col < RIGHT_BORDER:
-                    if (
-                        self.get_piece((row + 1) * COLS + col - 1).is_white()
-                        and self.get_piece((row - 1) * COLS + col + 1).is_empty()
-                    ):
-                        blacks[5] += 1
-                    if (
-                        self.get_piece((row + 1) * COLS + col + 1).is_white()
-                        and self.get_piece((row - 1) * COLS + col - 1).is_empty()
-                    ):
-                        blacks[5] += 1
-
-                # Protected pieces:
-                if row > TOP_BORDER:
-                    if col == LEFT_BORDER or col == RIGHT_BORDER:
-                        blacks[6] += 1
-                    elif (
-                        self.get_piece((row - 1) * COLS + col - 1).is_black()
-                        or not self.get_piece((row - 1) * COLS + col - 1).is_queen()
-                    ) and (
-                        self.get_piece((row - 1) * COLS + col + 1).is_black()
-                        or not self.get_piece((row - 1) * COLS + col + 1).is_queen()
-                    ):
-                        blacks[6] += 1
-
-        # Every criteria has more or less impact on the game
-        # so we need to 'weight' them:
-        weights = [5, 7.5, 4, 2.5, 0.5, -3, 3]
-
-        # Accumulating final score:
-        score = 0
-        for i in range(7):
-            score += weights[i] * (blacks[i] - whites[i])
+    @property
+    def hash(self) -> int:
+        return self._hash
+
+    def compute_hash(self) -> int:
+        # Hash from scratch, make_move and undo_move keep it up to date:
+        key = ZOBRIST_BLACK_TO_MOVE if self._turn_color == BLACK_COLOR else 0
+        for bit in iterate_bits(self._white | self._black):
+            key ^= ZOBRIST_PIECES[self._get_bit_type(bit)][bit]
+        return key
 
+    @property
+    def placement(self) -> float:
+        return self._placement
+
+    def compute_placement(self) -> float:
+        # Same from scratch for the placement part of the evaluation:
+        score = 0
+        for bit in iterate_bits(self._white | self._black):
+            score += PLACEMENT_SCORES[self._get_bit_type(bit)][bit]
         return score
 
+    @property
+    def whites_left(self) -> int:
+        return self._white.bit_count()
+
+    @property
+    def blacks_left(self) -> int:
+        return self._black.bit_count()
+
+    @property
+    def white_queens(self) -> int:
+        return (self._white & self._queens).bit_count()
+
+    @property
+    def black_queens(self) -> int:
+        return (self._black & self._queens).bit_count()
+
+    def is_game_over(self):
+        return not self._white or not self._black
+
+    def evaluate(self):
+        white = self._white
+        black = self._black
+
+        # If I'm not mistaken this is the order of scoring
+        # for victory state of the board, depending on color:
+        if not white:
+            return float("inf")
+        elif not black:
+            return float("-inf")
+
+        queens = self._queens
+        empty = ~(white | black) & FULL_MASK
+        white_queens = white & queens
+        black_queens = black & queens
+        white_rest = white & ~BOTTOM_ROW_MASK
+        black_rest = black & ~TOP_ROW_MASK
+
+        # Criteriums 0 to 4 and the edge and back row part of criterium 6
+        # depend only on the squares of the pieces, so make_move keeps
+        # their weighted sum up to date. Only neighbours are left to check.
+
+        # Pieces that can be taken this turn, once for every diagonal
+        # with an enemy in front and an empty tile behind:
+        white_inner = white_rest & ~TOP_ROW_MASK & ~EDGES_MASK
+        white_capturable = (
+            white_inner & shift_down_right(black) & shift_up_left(empty)
+        ).bit_count() + (
+            white_inner & shift_down_left(black) & shift_up_right(empty)
+        ).bit_count()
+        black_inner = black_rest & ~BOTTOM_ROW_MASK & ~EDGES_MASK
+        black_capturable = (
+            black_inner & shift_up_right(white) & shift_down_left(empty)
+        ).bit_count() + (
+            black_inner & shift_up_left(white) & shift_down_right(empty)
+        ).bit_count()
+
+        # Rest of the protected pieces are the ones without
+        # an enemy queen right behind them:
+        white_protected = (
+            white_rest
+            & ~EDGES_MASK
+            & ~shift_up_right(black_queens)
+            & ~shift_up_left(black_queens)
+        ).bit_count()
+        black_protected = (
+            black_rest
+            & ~EDGES_MASK
+            & ~shift_down_right(white_queens)
+            & ~shift_down_left(white_queens)
+        ).bit_count()
+
+        return (
+            self._placement
+            + EVALUATION_WEIGHTS[5] * (black_capturable - white_capturable)
+            + EVALUATION_WEIGHTS[6] * (black_protected - white_protected)
+        )
+
     def create_new_board(self):
-        self._board = [None] * ROWS * COLS
         # Setting the initial state of the board:
-        for tile_number in range(ROWS * COLS):
-            row = tile_number // COLS
-            col = tile_number % COLS
-            self._board[tile_number] = Piece(row, col, EMPTY_TILE)
-            if (row + col) % 2 == 1:
-                if row <= 2:
-                    self._board[tile_number].piece = BLACK_PIECE
-                elif row >= 5:
-                    self._board[tile_number].piece = WHITE_PIECE
+        self._white = WHITE_START_MASK
+        self._black = BLACK_START_MASK
+        self._queens = 0
+        self._turn_color = WHITE_COLOR
+        self._history = []
+        self._hash = self.compute_hash()
+        self._placement = self.compute_placement()
+
+    def load_bitboards(
+        self, white: int, black: int, queens: int, turn_color: int = WHITE_COLOR
+    ):
+        self._white = white
+        self._black = black
+        self._queens = queens & (white | black)
+        self._turn_color = turn_color
+        self._history = []
+        self._hash = self.compute_hash()
+        self._placement = self.compute_placement()
+
+    @staticmethod
+    def from_position(position: str, turn_color: int = WHITE_COLOR) -> "Board":
+        board = Board()
+        board.load_position(position, turn_color)
+        return board
+
+    def load_position(self, position: str, turn_color: int = WHITE_COLOR):
+        # Position is in the same format as str(board), 64 tiles row by row,
+        # whitespace is ignored, so it can be written as a diagram:
+        position = "".join(position.split())
+        if len(position) != ROWS * COLS:
+            raise ValueError(f"Position must have {ROWS * COLS} tiles: {position}")
+        self._white = self._black = self._queens = 0
+        for tile_number, char in enumerate(position):
+            if char == ".":
+                continue
+            if char not in "wbWB" or TILE_TO_SQUARE[tile_number] < 0:
+                raise ValueError(f"Invalid piece {char!r} on tile {tile_number}")
+            bit = TILE_TO_BIT[tile_number]
+            if char in "wW":
+                self._white |= bit
+            else:
+                self._black |= bit
+            if char in "WB":
+                self._queens |= bit
+        self._turn_color = turn_color
+        self._history = []
+        self._hash = self.compute_hash()
+        self._placement = self.compute_placement()
+
+    def get_piece_type(self, tile_number: int) -> int:
+        square = TILE_TO_SQUARE[tile_number]
+        if square < 0:
+            return EMPTY_TILE
+        return self._get_bit_type(1 << square)
+
+    def _get_bit_type(self, bit: int) -> int:
+        if self._white & bit:
+            piece = WHITE_PIECE
+        elif self._black & bit:
+            piece = BLACK_PIECE
+        else:
+            return EMPTY_TILE
+        return piece | QUEEN if self._queens & bit else piece
 
     def get_piece(self, tile_number: int) -> Piece:
-        return self._board[tile_number]
+        return Piece(
+            tile_number // COLS, tile_number % COLS, self.get_piece_type(tile_number)
+        )
 
     def _calculate_next_jumps(
         self,
         org_tile: int,
-        piece_tile: int,
-        dir: tuple[int, int],
-        all_moves: set,
-        eaten: list,
+        org_bit: int,
+        jumps: dict,
+        opponent: int,
+        empty: int,
+        all_moves: dict,
     ) -> None:
-        # Save data of original piece:
-        org_piece = self.get_piece(org_tile)
-        cur_piece = self.get_piece(piece_tile)
-
-        # Now short_dirs will also depend on direction we came from
-        # so we won't go back and forth, and that is why
-        # there are only 3 directions for queens:
-        short_dirs = (
-            [(dir[0], dir[1]), (dir[0], -dir[1]), (-dir[0], dir[1])]
-            if org_piece.is_queen()
-            else [(dir[0], dir[1]), (dir[0], -dir[1])]
-        )
+        # Capture sequences are walked as states of the square the piece
+        # stands on and the pieces eaten so far. Same pieces eaten in another
+        # order lead to the same state, which is explored only once:
+        stack = [(org_bit, 0, ())]
+        while stack:
+            piece_bit, captured, eaten = stack.pop()
+            # Every direction is tried, jumping back is impossible anyway
+            # since the piece we came over is already captured:
+            for short_bit, adv_bit in jumps[piece_bit]:
+                # We only jump over the pieces of the opposite color
+                # and only if the longer diagonal tile is empty:
+                if not (short_bit & opponent and adv_bit & empty):
+                    continue
+                if short_bit & captured:
+                    continue
 
-        # Iterating over all possible short diagonal moves:
-        for sh_dir in short_dirs:
-            short_cords = (cur_piece.row + sh_dir[0], cur_piece.col + sh_dir[1])
-            if (
-                TOP_BORDER <= short_cords[0] <= BOTTOM_BORDER
-                and LEFT_BORDER <= short_cords[1] <= RIGHT_BORDER
-            ):
-                # Getting the piece on the short diagonal tile:
-                short_tile = short_cords[0] * COLS + short_cords[1]
-                short_piece = self.get_piece(short_tile)
-
-                # Now if the tile is empty, we won't move there:
-                if short_piece.is_empty():
+                # Key of the move is checked before the move is made:
+                adv_tile = BIT_TO_TILE[adv_bit]
+                new_captured = captured | short_bit
+                key = org_tile | adv_tile << 6 | new_captured << 12
+                if key in all_moves:
                     continue
+                new_eaten = eaten + (
+                    (BIT_TO_TILE[short_bit], self._get_bit_type(short_bit)),
+                )
+                all_moves[key] = Move(org_tile, adv_tile, new_eaten, new_captured)
+                stack.append((adv_bit, new_captured, new_eaten))
+
+    def _jumpers(self, pieces: int) -> int:
+        # All pieces in the mask must be of the same color:
+        if self._white & pieces:
+            opponent = self._black
+            forward, backward = UP_DIRECTIONS, DOWN_DIRECTIONS
+        else:
+            opponent = self._white
+            forward, backward = DOWN_DIRECTIONS, UP_DIRECTIONS
+        empty = ~(self._white | self._black) & FULL_MASK
+        queens = pieces & self._queens
+
+        # Pieces with an enemy in front and an empty tile behind it
+        # are the only ones that can start a jump:
+        jumpers = 0
+        for _, back in forward:
+            jumpers |= pieces & back(back(empty) & opponent)
+        if queens:
+            for _, back in backward:
+                jumpers |= queens & back(back(empty) & opponent)
+        return jumpers
+
+    def _generate_jumps(self, pieces: int) -> list[Move]:
+        if self._white & pieces:
+            opponent, forward_jumps = self._black, UP_JUMPS
+        else:
+            opponent, forward_jumps = self._white, DOWN_JUMPS
+        empty = ~(self._white | self._black) & FULL_MASK
+
+        jumping_moves = {}
+        for piece_bit in iterate_bits(self._jumpers(pieces)):
+            # Jumps are searched from the original tile, which stays occupied
+            # so the piece can never land back on it:
+            self._calculate_next_jumps(
+                BIT_TO_TILE[piece_bit],
+                piece_bit,
+                ALL_JUMPS if self._queens & piece_bit else forward_jumps,
+                opponent,
+                empty,
+                jumping_moves,
+            )
+        return list(jumping_moves.values())
 
-                # We only jump if the piece is of the opposite color:
-                if short_piece.is_opposite_color(org_piece):
-                    adv_cords = (
-                        cur_piece.row + 2 * sh_dir[0],
-                        cur_piece.col + 2 * sh_dir[1],
-                    )
-                    if (
-                        TOP_BORDER <= adv_cords[0] <= BOTTOM_BORDER
-                        and LEFT_BORDER <= adv_cords[1] <= RIGHT_BORDER
-                    ):
-                        # Getting the piece on the longer diagonal tile:
-                        adv_tile = adv_cords[0] * COLS + adv_cords[1]
-                        adv_piece = self.get_piece(adv_tile)
-
-                        # If the longer diagonal tile is empty, we can jump there:
-                        if adv_piece.is_empty():
-                            new_eaten = eaten + [(short_tile, short_piece.piece)]
-                            move_to_add = Move(org_tile, adv_tile, new_eaten)
-                            if move_to_add not in all_moves:
-                                all_moves.add(move_to_add)
-                                # Now recursively checking for more jumps:
-                                self._calculate_next_jumps(
-                                    org_tile, adv_tile, sh_dir, all_moves, new_eaten
-                                )
+    def _generate_short_moves(self, pieces: int) -> list[Move]:
+        if self._white & pieces:
+            forward, backward = UP_DIRECTIONS, DOWN_DIRECTIONS
+        else:
+            forward, backward = DOWN_DIRECTIONS, UP_DIRECTIONS
+        empty = ~(self._white | self._black) & FULL_MASK
+
+        # Regular pieces only go forward, queens go both ways:
+        movers = [(shift, back, pieces) for shift, back in forward]
+        queens = pieces & self._queens
+        if queens:
+            movers += [(shift, back, queens) for shift, back in backward]
+
+        short_moves = []
+        for shift, back, movable in movers:
+            for target_bit in iterate_bits(shift(movable) & empty):
+                short_moves.append(
+                    Move(BIT_TO_TILE[back(target_bit)], BIT_TO_TILE[target_bit])
+                )
+        return short_moves
+
+    def _generate_moves(
+        self, pieces: int, forced_jumping: bool, captures_only: bool = False
+    ) -> tuple[list, list]:
+        if captures_only:
+            return [], self._generate_jumps(pieces)
+        # With forced jumping a single mask query tells which kind
+        # of moves is legal, so the other one is never generated:
+        if forced_jumping:
+            if self._jumpers(pieces):
+                return [], self._generate_jumps(pieces)
+            return self._generate_short_moves(pieces), []
+        return self._generate_short_moves(pieces), self._generate_jumps(pieces)
 
     def calculate_next_moves(
         self, piece_tile: int, forced_jumping: bool = False
     ) -> set:
-        # Lists of possible moves:
-        short_moves = set()
-        jumping_moves = set()
-
-        # Getting the piece:
-        piece = self.get_piece(piece_tile)
-        if piece.is_empty():
-            return short_moves
-
-        # Direction is different for white and black pieces:
-        row_dir = -1 if piece.is_white() else 1
-        # short_dirs => directions for short diagonal moves:
-        short_dirs = (
-            [(row_dir, 1), (row_dir, -1), (-row_dir, 1), (-row_dir, -1)]
-            if piece.is_queen()
-            else [(row_dir, 1), (row_dir, -1)]
-        )
-
-        # Iterating over all possible short diagonal moves:
-        for sh_dir in short_dirs:
-            short_cords = (piece.row + sh_dir[0], piece.col + sh_dir[1])
-            if (
-                TOP_BORDER <= short_cords[0] <= BOTTOM_BORDER
-                and LEFT_BORDER <= short_cords[1] <= RIGHT_BORDER
-            ):
-                # Getting the piece on the short diagonal tile:
-                short_tile = short_cords[0] * COLS + short_cords[1]
-                short_piece = self.get_piece(short_tile)
-
-                # If the tile is empty, we can move there:
-                if short_piece.is_empty():
-                    move_to_add = Move(piece_tile, short_tile)
-                    short_moves.add(move_to_add)
-                elif short_piece.is_opposite_color(piece):
-                    # Since the tile is not empty, we can check
-                    # the longer diagonal tile for potential jumps:
-                    adv_cords = (
-                        short_piece.row + sh_dir[0],
-                        short_piece.col + sh_dir[1],
-                    )
-                    if (
-                        TOP_BORDER <= adv_cords[0] <= BOTTOM_BORDER
-                        and LEFT_BORDER <= adv_cords[1] <= RIGHT_BORDER
-                    ):
-                        # Getting the piece on the longer diagonal tile:
-                        adv_tile = adv_cords[0] * COLS + adv_cords[1]
-                        adv_piece = self.get_piece(adv_tile)
-
-                        # If the longer diagonal tile is empty, we can jump there:
-                        if adv_piece.is_empty():
-                            # Adding a piece to eat:
-                            eaten = [(short_tile, short_piece.piece)]
-                            adv_move = Move(piece_tile, adv_tile, eaten)
-                            if adv_move not in jumping_moves:
-                                jumping_moves.add(adv_move)
-                                # Now recursively checking for more jumps:
-                                self._calculate_next_jumps(
-                                    piece_tile, adv_tile, sh_dir, jumping_moves, eaten
-                                )
+        square = TILE_TO_SQUARE[piece_tile]
+        if square < 0 or not (self._white | self._black) & (1 << square):
+            return set()
+        short_moves, jumping_moves = self._generate_moves(1 << square, forced_jumping)
 
         # Depending on the forced_jumping flag, we return different moves:
-        if forced_jumping:
-            if len(jumping_moves) == 0:
-                # Short if there are no jumps:
-                return short_moves
-            # Otherwise, we return only the jumping moves:
-            return jumping_moves
+        if forced_jumping and jumping_moves:
+            # We return only the jumping moves:
+            return set(jumping_moves)
 
         # This is the 'default' case, where we return combined moves:
-        return short_moves.union(jumping_moves)
+        return set(jumping_moves + short_moves)
 
     def get_all_piece_tiles(self, color: int) -> list[int]:
-        # We will store the tiles of the pieces in this list:
-        pieces = []
-        for piece in self._board:
-            # Only possible pieces are the ones that are not empty
-            # and have the desired color:
-            if not piece.is_empty() and piece.is_color(color):
-                pieces.append(piece.row * COLS + piece.col)
-
-        return pieces
+        pieces = self._white if color == WHITE_COLOR else self._black
+        return [BIT_TO_TILE[bit] for bit in iterate_bits(pieces)]
 
     def calculate_all_turn_moves(
         self, color: int, forced_jumping: bool = False
     ) -> list[Move]:
-        # We will get them by iterating over all pieces of the desired color
-        # and accumulating their possible moves, in this list:
-        all_turn_moves = set()
-        piece_tiles = self.get_all_piece_tiles(color)
-
-        # Iterating over all pieces:
-        for piece_tile in piece_tiles:
-            all_turn_moves = all_turn_moves.union(self.calculate_next_moves(piece_tile, forced_jumping))
-
-        # If there are forced jumps, we need to filter out the moves that are not jumps:
-        if forced_jumping:
-            filtered = list(
-                filter(lambda mov: len(mov.eaten_tiles) > 0, all_turn_moves)
-            )
-            if len(filtered) > 0:
-                all_turn_moves = filtered
+        pieces = self._white if color == WHITE_COLOR else self._black
+        if not pieces:
+            return []
+        short_moves, jumping_moves = self._generate_moves(pieces, forced_jumping)
 
         # Sorting moves by the number of eaten pieces
         # this might speed up the alpha-beta pruning algorithm:
-        all_turn_moves = sorted(
-            all_turn_moves, key=lambda mov: len(mov.eaten_tiles), reverse=True
+        return (
+            sorted(jumping_moves, key=lambda mov: len(mov.eaten_tiles), reverse=True)
+            + short_moves
         )
-        return all_turn_moves
+
+    def calculate_all_turn_captures(self, color: int) -> list[Move]:
+        pieces = self._white if color == WHITE_COLOR else self._black
+        if not pieces:
+            return []
+        _, jumping_moves = self._generate_moves(pieces, True, True)
+        return sorted(jumping_moves, key=lambda mov: len(mov.eaten_tiles), reverse=True)
+
+    def has_capture(self, color: int) -> bool:
+        pieces = self._white if color == WHITE_COLOR else self._black
+        return bool(self._jumpers(pieces))
+
+    def has_any_move(self, color: int) -> bool:
+        # Any jump or any step to an empty tile, without generating moves:
+        pieces = self._white if color == WHITE_COLOR else self._black
+        if self._jumpers(pieces):
+            return True
+        if color == WHITE_COLOR:
+            forward, backward = UP_DIRECTIONS, DOWN_DIRECTIONS
+        else:
+            forward, backward = DOWN_DIRECTIONS, UP_DIRECTIONS
+        empty = ~(self._white | self._black) & FULL_MASK
+        queens = pieces & self._queens
+        for shift, _ in forward:
+            if shift(pieces) & empty:
+                return True
+        for shift, _ in backward:
+            if shift(queens) & empty:
+                return True
+        return False
+
+    def calculate_all_turn_quiet_moves(self, color: int) -> list[Move]:
+        # Moves without a capture, whether the rules allow them or not:
+        pieces = self._white if color == WHITE_COLOR else self._black
+        if not pieces:
+            return []
+        return self._generate_short_moves(pieces)
+
+    def find_move(
+        self, move: Move, color: int, forced_jumping: bool = False
+    ) -> Move:
+        # Generated move equal to the given one if it is legal here, None otherwise.
+        # Only the moves of its piece are looked at, so moves remembered
+        # from other positions are cheap to check:
+        pieces = self._white if color == WHITE_COLOR else self._black
+        start_bit = TILE_TO_BIT.get(move.start_tile, 0) & pieces
+        if not start_bit:
+            return None
+        if move.captured:
+            for candidate in self._generate_jumps(start_bit):
+                if candidate == move:
+                    return candidate
+            return None
+
+        # Short move only needs an empty neighbour in the right direction:
+        if self._queens & start_bit:
+            steps = ALL_STEPS
+        else:
+            steps = UP_STEPS if color == WHITE_COLOR else DOWN_STEPS
+        target_bit = TILE_TO_BIT.get(move.target_tile, 0)
+        if not target_bit & steps[start_bit] & ~(self._white | self._black):
+            return None
+        if forced_jumping and self._jumpers(pieces):
+            return None
+        return move
 
     def make_move(self, move: Move):
-        # We get data about the move:
-        start_piece = self.get_piece(move.start_tile)
-        target_piece = self.get_piece(move.target_tile)
-
-        # Potential queen promotion:
-        if target_piece.row == TOP_BORDER or target_piece.row == BOTTOM_BORDER:
-            # promoted_to_queen() is not modifying the piece in place:
-            target_piece.piece = start_piece.promoted_to_queen()
-
-            # Increasing number of queens:
-            if start_piece.is_white():
-                self._white_queens += 1
-            else:
-                self._black_queens += 1
+        self._history.append(
+            (
+                self._white,
+                self._black,
+                self._queens,
+                self._turn_color,
+                self._hash,
+                self._placement,
+            )
+        )
+
+        start_bit = TILE_TO_BIT[move.start_tile]
+        target_bit = TILE_TO_BIT[move.target_tile]
+        start_type = self._get_bit_type(start_bit)
+
+        # Eaten pieces leave the hash before they leave the masks:
+        key = self._hash ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_PIECES[start_type][start_bit]
+        placement = self._placement - PLACEMENT_SCORES[start_type][start_bit]
+        eaten_mask = move.captured
+        for eaten_bit in iterate_bits(eaten_mask):
+            eaten_type = self._get_bit_type(eaten_bit)
+            key ^= ZOBRIST_PIECES[eaten_type][eaten_bit]
+            placement -= PLACEMENT_SCORES[eaten_type][eaten_bit]
+
+        # Potential queen promotion happens on the far row of each color:
+        if start_type & WHITE_COLOR:
+            self._white ^= start_bit | target_bit
+            self._black &= ~eaten_mask
+            promotion_row = TOP_ROW_MASK
         else:
-            # Moving the piece, that is not a queen:
-            target_piece.piece = start_piece.piece
-        # Removing the piece from the start tile:
-        start_piece.piece = EMPTY_TILE
-
-        # Removing eaten pieces:
-        for eaten_tile, piece_type in move.eaten_tiles:
-            eaten_piece = self.get_piece(eaten_tile)
-
-            # Decreasing number of pieces depending on the type of the eaten piece:
-            if eaten_piece.is_queen():
-                if eaten_piece.is_white():
-                    self._white_queens -= 1
-                    # Mustn't forget to decrease the number of regular pieces:
-                    self._whites_left -= 1
-                else:
-                    self._black_queens -= 1
-                    self._blacks_left -= 1
-            else:
-                if eaten_piece.is_white():
-                    self._whites_left -= 1
-                else:
-                    self._blacks_left -= 1
+            self._black ^= start_bit | target_bit
+            self._white &= ~eaten_mask
+            promotion_row = BOTTOM_ROW_MASK
+        if start_type & QUEEN or target_bit & promotion_row:
+            self._queens = (self._queens & ~start_bit) | target_bit
+            start_type |= QUEEN
+
+        # Removing eaten queens:
+        self._queens &= ~eaten_mask
 
-            # Making the eaten piece eaten:
-            eaten_piece.piece = EMPTY_TILE
+        self._hash = key ^ ZOBRIST_PIECES[start_type][target_bit]
+        self._placement = placement + PLACEMENT_SCORES[start_type][target_bit]
+        self._turn_color = Piece.get_oposite_piece_color(self._turn_color)
 
     def undo_move(self, move: Move):
-        # Undo is inverse of make_move...
-        start_piece = self.get_piece(move.start_tile)
-        target_piece = self.get_piece(move.target_tile)
-        # Potential queen demotion:
-        if target_piece.row == TOP_BORDER or target_piece.row == BOTTOM_BORDER:
-            if target_piece.is_white():
-                self._white_queens -= 1
-            else:
-                self._black_queens -= 1
-            start_piece.piece = target_piece.demoted_to_piece()
-        else:
-            start_piece.piece = target_piece.piece
-        target_piece.piece = EMPTY_TILE
-
-        # Adding eaten pieces:
-        for eaten_tile, piece_type in move.eaten_tiles:
-            eaten_piece = self.get_piece(eaten_tile)
-            # Increase number of pieces:
-            if Piece.is_piece_queen(piece_type):
-                if Piece.is_piece_white(piece_type):
-                    self._white_queens += 1
-                    self._whites_left += 1
-                else:
-                    self._black_queens += 1
-                    self._blacks_left += 1
-            else:
-                if Piece.is_piece_white(piece_type):
-                    self._whites_left += 1
-                else:
-                    self._blacks_left += 1
-            # Now we bring back eaten piece type:
-            eaten_piece.piece = piece_type
+        # Undo is inverse of make_move, so we just restore the saved state:
+        self.restore(self._history.pop())
 
     def __str__(self) -> str:
-        ans = ""
-        for tile_number in range(ROWS * COLS):
-            ans += str(self._board[tile_number])
-        return ans
+        ans = ["."] * (ROWS * COLS)
+        for bit in iterate_bits(self._white):
+            ans[BIT_TO_TILE[bit]] = "W" if self._queens & bit else "w"
+        for bit in iterate_bits(self._black):
+            ans[BIT_TO_TILE[bit]] = "B" if self._queens & bit else "b"
+        return "".join(ans)
 
     def __repr__(self) -> str:
         return self.__str__()
@@ -58,3 +58,41 @@ HEADER_COLOR = BLACK_TILE_COLOR
 ### Fonts ###
 TEXT_SIZE = 30
 HEADER_SIZE = 72
+
+### Search ###
+# Seconds the computer may think about a move:
+SEARCH_TIME_BUDGET = 3
+# Deepest iteration the search will ever start:
+MAX_SEARCH_DEPTH = 64
+# Number of visited nodes between two clock checks:
+TIME_CHECK_INTERVAL = 1024
+# With more than one worker, search runs in separate processes:
+SEARCH_WORKERS = 1
+# How the workers share the search:
+ROOT_SPLITTING = 0
+LAZY_SMP = 1
+PARALLEL_SEARCH = ROOT_SPLITTING
+# Workers start from a fresh interpreter, forking the window process would
+# copy its threads and display state:
+PROCESS_START_METHOD = "spawn"
+# Memory cap for the transposition table, in bytes:
+TRANSPOSITION_TABLE_MEMORY = 32 * 1024 * 1024
+
+### Endgame tablebases ###
+# Directory with the generated tables, positions are probed if it exists:
+TABLEBASE_DIRECTORY = "tablebases"
+# Tables are generated for positions with at most this many pieces:
+TABLEBASE_PIECES = 3
+# Score of a won table position, lowered by the distance to the win:
+TABLEBASE_WIN_SCORE = 10000
+
+### Opening book ###
+# File with the precomputed openings, used if it exists:
+OPENING_BOOK_PATH = "openings.book"
+# Book covers positions up to this many moves into the game:
+OPENING_BOOK_PLIES = 4
+# Depth of the searches that fill the book:
+OPENING_BOOK_DEPTH = 10
+
+# Values of the --forced option of the command line tools:
+FORCED_JUMPING_MODES = {"on": [True], "off": [False], "both": [False, True]}
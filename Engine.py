@@ -0,0 +1,536 @@
+import time
+
+from Board import Board
+from Constants import *
+from Move import Move
+from Tablebase import Tablebase
+from TranspositionTable import (
+    ENTRY_DEPTH,
+    ENTRY_FLAG,
+    ENTRY_MOVE,
+    ENTRY_SCORE,
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND,
+    TranspositionTable,
+)
+
+
+class SearchResult(object):
+    def __init__(
+        self,
+        move: Move,
+        value: float,
+        depth: int,
+        nodes: int,
+        elapsed_time: float,
+        cutoff_on_first_move: float,
+        table_stats: dict,
+        depth_times: list[float] = None,
+    ) -> None:
+        self.move = move
+        self.value = value
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed_time = elapsed_time
+        self.cutoff_on_first_move = cutoff_on_first_move
+        self.table_stats = table_stats
+        # Seconds from the start until each iteration was completed:
+        self.depth_times = depth_times if depth_times is not None else []
+
+    @property
+    def nodes_per_second(self) -> float:
+        if self.elapsed_time <= 0:
+            return 0.0
+        return self.nodes / self.elapsed_time
+
+    def __str__(self) -> str:
+        return (
+            f"{self.move} (value {self.value}, depth {self.depth}, "
+            f"{self.nodes} nodes in {self.elapsed_time:.2f}s)"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Engine(object):
+    def __init__(
+        self,
+        table_memory: int = TRANSPOSITION_TABLE_MEMORY,
+        transposition_table: TranspositionTable = None,
+        tablebase: Tablebase = None,
+    ) -> None:
+        # Table can also be given from outside, e.g. shared between processes,
+        # then it is cleared by its owner and not by every engine using it:
+        self._owns_table = transposition_table is None
+        self.transposition_table = (
+            transposition_table
+            if transposition_table is not None
+            else TranspositionTable(table_memory)
+        )
+        # Endgame tables are used whenever they have been generated:
+        self.tablebase = tablebase if tablebase is not None else Tablebase()
+        self.new_game()
+
+    def new_game(self) -> None:
+        self.start_time = time.time()
+        self._deadline = self.start_time
+        self._stop_event = None
+        self._timed_out = False
+        self._principal_variation = []
+        self.nodes = 0
+        self.completed_depth = 0
+        self.depth_times = []
+        self.reset_move_ordering()
+        # Positions from the previous game are of no use:
+        if self._owns_table:
+            self.transposition_table.clear()
+        else:
+            self.transposition_table.reset_stats()
+
+    def start(self) -> None:
+        # Engines with worker processes start them here, serial one has none:
+        pass
+
+    def close(self) -> None:
+        self.tablebase.close()
+
+    @property
+    def timed_out(self) -> bool:
+        return self._timed_out
+
+    def begin_search(self, time_budget: float, stop_event=None) -> None:
+        self.start_time = time.time()
+        self._deadline = self.start_time + time_budget
+        # Setting the event (threading.Event or alike) ends the search early:
+        self._stop_event = stop_event
+        self._timed_out = False
+        self._principal_variation = []
+        self.nodes = 0
+        self.completed_depth = 0
+        self.depth_times = []
+        self.reset_move_ordering()
+        self.transposition_table.reset_stats()
+
+    def search(
+        self,
+        board: Board,
+        turn_color: int,
+        forced_jumping: bool = False,
+        time_budget: float = SEARCH_TIME_BUDGET,
+        max_depth: int = MAX_SEARCH_DEPTH,
+        stop_event=None,
+    ) -> SearchResult:
+        # Key of the position has to match the side we search for:
+        board.turn_color = turn_color
+        value, move = self.iterative_deepening(
+            board, turn_color, forced_jumping, time_budget, max_depth, stop_event
+        )
+        self._stop_event = None
+        return SearchResult(
+            move,
+            value,
+            self.completed_depth,
+            self.nodes,
+            time.time() - self.start_time,
+            self.cutoff_on_first_move,
+            self.table_stats(),
+            list(self.depth_times),
+        )
+
+    def iterative_deepening(
+        self,
+        board: Board,
+        turn_color: int,
+        forced_jumping: bool = False,
+        time_budget: float = SEARCH_TIME_BUDGET,
+        max_depth: int = MAX_SEARCH_DEPTH,
+        stop_event=None,
+        start_depth: int = 1,
+    ) -> tuple[float, Move]:
+        self.begin_search(time_budget, stop_event)
+
+        is_maximising_player = turn_color == BLACK_COLOR
+        moves = board.calculate_all_turn_moves(turn_color, forced_jumping)
+        # There is nothing to think about with less than two moves:
+        if len(moves) <= 1:
+            return board.evaluate(), moves[0] if moves else None
+
+        best_value, best_move = board.evaluate(), moves[0]
+        for depth in range(start_depth, max_depth + 1):
+            value, move = self.search_root(
+                board,
+                self.order_root_moves(moves, best_move),
+                depth,
+                is_maximising_player,
+                forced_jumping,
+            )
+            # Unfinished iteration can't be trusted, we keep the last one:
+            if self._timed_out:
+                break
+            best_value, best_move = value, move
+            self.completed_depth = depth
+            self.depth_times.append(time.time() - self.start_time)
+            self._principal_variation = self.get_principal_variation(
+                board, depth, forced_jumping
+            )
+
+            # Won or lost position won't change with deeper search:
+            if value in (float("inf"), float("-inf")):
+                break
+            # Next iteration takes a lot longer, so there is no point
+            # starting it if half of the time is already gone:
+            if time.time() - self.start_time > time_budget / 2:
+                break
+
+        return best_value, best_move
+
+    def order_root_moves(self, moves: list[Move], best_move: Move) -> list[Move]:
+        # Root moves don't depend on killers and history: the last best move
+        # goes first, the rest in the generated order. Ties go to the earlier
+        # move, so every search of the root picks the same one:
+        if best_move not in moves:
+            return list(moves)
+        return [best_move] + [move for move in moves if move != best_move]
+
+    def search_root(
+        self,
+        board: Board,
+        moves: list[Move],
+        depth: int,
+        is_maximising_player: bool,
+        forced_jumping: bool = False,
+    ) -> tuple[float, Move]:
+        # Moves are searched in the given order. If every move loses,
+        # the first one is kept, there is nothing better to play:
+        alpha, beta = float("-inf"), float("inf")
+        best_value, best_move = None, None
+        for move_index, move in enumerate(moves):
+            board.make_move(move)
+            value = self.minimax(
+                board,
+                depth - 1,
+                alpha,
+                beta,
+                not is_maximising_player,
+                forced_jumping,
+                1,
+            )[0]
+            board.undo_move(move)
+            if self._timed_out:
+                return best_value, best_move
+            if best_move is None or (
+                value > best_value if is_maximising_player else value < best_value
+            ):
+                best_value, best_move = value, move
+            if is_maximising_player:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if beta <= alpha:
+                self.record_cutoff(move, move_index, depth, 0)
+                break
+
+        # Window of the root is never narrowed, so the value is exact:
+        self.transposition_table.store(board.hash, depth, best_value, EXACT, best_move)
+        return best_value, best_move
+
+    def reset_move_ordering(self) -> None:
+        # Two quiet moves per ply that caused the latest cutoffs:
+        self._killers = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        # How good each (start tile, target tile) quiet move was so far:
+        self._history = [0] * (ROWS * COLS * ROWS * COLS)
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def table_stats(self) -> dict:
+        return self.transposition_table.stats()
+
+    @property
+    def cutoff_on_first_move(self) -> float:
+        if self.cutoffs == 0:
+            return 0.0
+        return 100 * self.first_move_cutoffs / self.cutoffs
+
+    def generate_moves(
+        self,
+        state: Board,
+        color: int,
+        forced_jumping: bool,
+        tt_move: Move,
+        ply: int,
+    ):
+        # Moves come in stages and every stage is generated only when
+        # the previous one runs out, so a cutoff skips the rest of them.
+        # Best move we know goes first:
+        tried = []
+        if tt_move is not None:
+            move = state.find_move(tt_move, color, forced_jumping)
+            if move is not None:
+                tried.append(move.key)
+                yield move
+
+        # Then captures, the longer ones first:
+        captures = state.calculate_all_turn_captures(color)
+        for move in captures:
+            if move.key not in tried:
+                yield move
+        if forced_jumping and captures:
+            return
+
+        # Then quiet moves that caused cutoffs in the sibling nodes:
+        if ply < len(self._killers):
+            for killer in self._killers[ply]:
+                if killer is None or killer.key in tried:
+                    continue
+                move = state.find_move(killer, color, forced_jumping)
+                if move is not None:
+                    tried.append(move.key)
+                    yield move
+
+        # And the rest of quiet moves by their history:
+        history = self._history
+        quiet_moves = [
+            move
+            for move in state.calculate_all_turn_quiet_moves(color)
+            if move.key not in tried
+        ]
+        quiet_moves.sort(
+            key=lambda move: history[move.start_tile * ROWS * COLS + move.target_tile],
+            reverse=True,
+        )
+        yield from quiet_moves
+
+    def record_cutoff(self, move: Move, move_index: int, depth: int, ply: int) -> None:
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+
+        # Captures are searched early anyway:
+        if move.captured:
+            return
+        if ply < len(self._killers):
+            killers = self._killers[ply]
+            if move != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move
+        self._history[move.start_tile * ROWS * COLS + move.target_tile] += depth * depth
+
+    def get_principal_variation(
+        self, board: Board, depth: int, forced_jumping: bool = False
+    ) -> list[tuple[int, Move]]:
+        # Following the best moves stored in the table:
+        variation = []
+        for _ in range(depth):
+            entry = self.transposition_table.probe(board.hash)
+            if entry is None or entry[ENTRY_MOVE] is None:
+                break
+            # Shared table only knows the key of the move,
+            # so we play the generated move with its eaten pieces:
+            moves = board.calculate_all_turn_moves(board.turn_color, forced_jumping)
+            if entry[ENTRY_MOVE] not in moves:
+                break
+            move = moves[moves.index(entry[ENTRY_MOVE])]
+            variation.append((board.hash, move))
+            board.make_move(move)
+        for _, move in reversed(variation):
+            board.undo_move(move)
+        return variation
+
+    def _visit_node(self) -> bool:
+        # Clock is only checked every once in a while:
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and self.should_stop():
+            self._timed_out = True
+        return self._timed_out
+
+    def should_stop(self) -> bool:
+        return time.time() > self._deadline or (
+            self._stop_event is not None and self._stop_event.is_set()
+        )
+
+    def quiescence(
+        self,
+        state: Board,
+        alpha: float,
+        beta: float,
+        is_maximising_player: bool,
+        forced_jumping: bool = False,
+    ) -> float:
+        if self._visit_node():
+            return 0
+        if state.is_game_over():
+            return state.evaluate()
+
+        captures = state.calculate_all_turn_captures(
+            BLACK_COLOR if is_maximising_player else WHITE_COLOR
+        )
+        # Side to move may keep the static score instead of capturing (stand pat),
+        # unless the rules make it jump:
+        if captures and forced_jumping:
+            best_eval = float("-inf") if is_maximising_player else float("inf")
+        else:
+            best_eval = state.evaluate()
+            if is_maximising_player:
+                if best_eval >= beta:
+                    return best_eval
+                alpha = max(alpha, best_eval)
+            else:
+                if best_eval <= alpha:
+                    return best_eval
+                beta = min(beta, best_eval)
+
+        # Every capture takes a piece, so this always comes to an end:
+        for move in captures:
+            state.make_move(move)
+            eval = self.quiescence(
+                state, alpha, beta, not is_maximising_player, forced_jumping
+            )
+            state.undo_move(move)
+            if self._timed_out:
+                return best_eval
+            if is_maximising_player:
+                best_eval = max(best_eval, eval)
+                alpha = max(alpha, eval)
+            else:
+                best_eval = min(best_eval, eval)
+                beta = min(beta, eval)
+            if beta <= alpha:
+                break
+        return best_eval
+
+    def minimax(
+        self,
+        state: Board,
+        depth: int,
+        alpha: float,
+        beta: float,
+        is_maximising_player: bool,
+        forced_jumping: bool = False,
+        ply: int = 0,
+    ):
+        if self._visit_node():
+            return 0, None
+
+        # Solved endgames are looked up instead of searched, except in the root
+        # which must return a move:
+        if ply > 0 and (state.white | state.black).bit_count() <= (
+            self.tablebase.max_pieces
+        ):
+            score = self.tablebase.probe(state, forced_jumping)
+            if score is not None:
+                return score, None
+
+        state_hash = state.hash
+        entry = self.transposition_table.probe(state_hash)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[ENTRY_MOVE]
+            # Result of a deep enough search can be reused, except in the root
+            # which must return a move made by the move generator:
+            if entry[ENTRY_DEPTH] >= depth and ply > 0:
+                score = entry[ENTRY_SCORE]
+                if entry[ENTRY_FLAG] == EXACT:
+                    return score, tt_move
+                elif entry[ENTRY_FLAG] == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if beta <= alpha:
+                    return score, tt_move
+
+        if state.is_game_over():
+            score = state.evaluate()
+            self.transposition_table.store(state_hash, 0, score, EXACT)
+            return score, None
+
+        # Horizon is pushed past pending captures, so the position
+        # is evaluated only once it is quiet:
+        if depth == 0:
+            score = self.quiescence(
+                state, alpha, beta, is_maximising_player, forced_jumping
+            )
+            if self._timed_out:
+                return score, None
+            if score <= alpha:
+                flag = UPPER_BOUND
+            elif score >= beta:
+                flag = LOWER_BOUND
+            else:
+                flag = EXACT
+            self.transposition_table.store(state_hash, 0, score, flag)
+            return score, None
+
+        maximizing = not is_maximising_player
+        alpha_orig = alpha
+        beta_orig = beta
+
+        # Best move from the previous iteration goes first,
+        # otherwise the best one from the table:
+        if (
+            ply < len(self._principal_variation)
+            and self._principal_variation[ply][0] == state_hash
+        ):
+            tt_move = self._principal_variation[ply][1]
+        moves = self.generate_moves(
+            state,
+            BLACK_COLOR if is_maximising_player else WHITE_COLOR,
+            forced_jumping,
+            tt_move,
+            ply,
+        )
+
+        if is_maximising_player:
+            best_eval = float("-inf")
+            best_move = None
+            for move_index, move in enumerate(moves):
+                state.make_move(move)
+                eval = self.minimax(
+                    state, depth - 1, alpha, beta, maximizing, forced_jumping, ply + 1
+                )[0]
+                state.undo_move(move)
+                # Nothing found after the time is up is stored, it is incomplete:
+                if self._timed_out:
+                    return best_eval, best_move
+                if eval > best_eval:
+                    best_eval = eval
+                    best_move = move
+                alpha = max(alpha, eval)
+                if beta <= alpha:
+                    self.record_cutoff(move, move_index, depth, ply)
+                    break
+        else:
+            best_eval = float("inf")
+            best_move = None
+            for move_index, move in enumerate(moves):
+                state.make_move(move)
+                eval = self.minimax(
+                    state,
+                    depth - 1,
+                    alpha,
+                    beta,
+                    maximizing,
+                    forced_jumping,
+                    ply + 1,
+                )[0]
+                state.undo_move(move)
+                if self._timed_out:
+                    return best_eval, best_move
+                if eval < best_eval:
+                    best_eval = eval
+                    best_move = move
+                beta = min(beta, eval)
+                if beta <= alpha:
+                    self.record_cutoff(move, move_index, depth, ply)
+                    break
+
+        if best_eval <= alpha_orig:
+            flag = UPPER_BOUND
+        elif best_eval >= beta_orig:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transposition_table.store(state_hash, depth, best_eval, flag, best_move)
+
+        return best_eval, best_move
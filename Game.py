@@ -1,22 +1,24 @@
 import random
-import time
-from copy import deepcopy
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import pygame
 
-from Board import Board
+from Board import SQUARE_TO_TILE, Board
 from Constants import *
+from Engine import Engine
+from LazySmpEngine import LazySmpEngine
 from Move import Move
+from OpeningBook import OpeningBook
+from ParallelEngine import ParallelEngine
 from Piece import Piece
+from RenderCache import RenderCache
 
 
 class Game(object):
-    transposition_table = {}
-
     def __init__(self, window: pygame.Surface) -> None:
         self._window = window
-        self._text_font = pygame.font.SysFont("Arial", TEXT_SIZE)
-        self._header_font = pygame.font.SysFont("Arial", HEADER_SIZE)
+        self._render_cache = RenderCache()
         self.single_x = SCREEN_WIDTH // 2 - BUTTON_WIDTH // 2
         self.single_y = SCREEN_HEIGHT // 2 - BUTTON_HEIGHT - 20
         self.multi_x = self.single_x
@@ -25,10 +27,28 @@ class Game(object):
         self.mode_y = self.multi_y + BUTTON_HEIGHT + 70
         self.play_again_x = self.multi_x
         self.play_again_y = self.multi_y + 50
+        if SEARCH_WORKERS <= 1:
+            self.engine = Engine()
+        elif PARALLEL_SEARCH == LAZY_SMP:
+            self.engine = LazySmpEngine(SEARCH_WORKERS)
+        else:
+            self.engine = ParallelEngine(SEARCH_WORKERS)
+        # Worker processes are started here, not from the search thread:
+        self.engine.start()
+        self.search_time_budget = SEARCH_TIME_BUDGET
+        self.opening_book = OpeningBook()
+        # Computer thinks in the background, so the window stays responsive:
+        self._search_executor = ThreadPoolExecutor(max_workers=1)
+        self._search_future: Future = None
+        self._search_stop: threading.Event = None
+        # What the window shows right now, nothing is drawn yet:
+        self._drawn_screen: tuple = None
+        self._drawn_tiles: list[tuple] = [None] * (ROWS * COLS)
 
         self.reset()
 
     def reset(self) -> None:
+        self.cancel_search()
         self._board = Board()
         self._turn_color = WHITE_COLOR
         self._selected_piece = None
@@ -42,7 +62,7 @@ class Game(object):
         self.white_won = False
         self.played_move: Move = None
         self.selected_color = SELECTED_TILE_WHITE_COLOR
-        self.start_time = time.time()
+        self.engine.new_game()
 
     @property
     def turn_color(self) -> int:
@@ -61,17 +81,65 @@ class Game(object):
         self._board = board
 
     def draw(self) -> None:
-        if self.show_main_menu:
-            self.draw_main_menu()
-        if self.show_game:
-            self.draw_board()
-            self.draw_played_move()
-            self.draw_selected_tile()
-            self.draw_pieces()
-            self.draw_valid_moves()
-        if self.game_over:
-            self.draw_game_over()
-        pygame.display.update()
+        # Only the tiles that changed since the last frame are drawn
+        # and sent to the display, a frame without changes costs nothing:
+        rects = []
+        screen = self._screen_state()
+        if screen != self._drawn_screen:
+            self._drawn_screen = screen
+            self._drawn_tiles = [None] * (ROWS * COLS)
+            if self.show_main_menu:
+                self.draw_main_menu()
+            if self.show_game:
+                self.draw_board()
+            if self.game_over:
+                self.draw_game_over()
+            rects.append(self._window.get_rect())
+        if self.show_game and not self.game_over:
+            tiles = self._tile_states()
+            for tile_number, state in enumerate(tiles):
+                if state != self._drawn_tiles[tile_number]:
+                    rects.append(self.draw_tile(tile_number, state))
+            self._drawn_tiles = tiles
+        if rects:
+            pygame.display.update(rects)
+
+    def invalidate(self) -> None:
+        # Whole window is drawn again on the next frame:
+        self._drawn_screen = None
+
+    def _screen_state(self) -> tuple:
+        return (
+            self.show_main_menu,
+            self.show_game,
+            self.game_over,
+            self.white_won,
+            self.forced_jumping,
+        )
+
+    def _tile_states(self) -> list[tuple]:
+        # Everything that is drawn on a tile, so changed tiles are found
+        # by comparing these with the ones from the last frame:
+        pieces = [EMPTY_TILE] * (ROWS * COLS)
+        for square, piece in enumerate(self._board.squares):
+            pieces[SQUARE_TO_TILE[square]] = piece
+        played = {}
+        if self.played_move is not None:
+            played[self.played_move.start_tile] = self.selected_color
+            played[self.played_move.target_tile] = self.selected_color
+        # Moves of the selected piece are shown as see-through pieces:
+        ghosts = {}
+        for move in self._current_turn_moves:
+            ghosts[move.target_tile] = pieces[move.start_tile]
+        return [
+            (
+                played.get(tile_number),
+                tile_number == self._selected_piece,
+                pieces[tile_number],
+                ghosts.get(tile_number, EMPTY_TILE),
+            )
+            for tile_number in range(ROWS * COLS)
+        ]
 
     def draw_game_over(self) -> None:
         self._window.fill(MAIN_MENU_COLOR)
@@ -79,7 +147,7 @@ class Game(object):
             text = "White won!"
         else:
             text = "Black won!"
-        text_surface = self._header_font.render(text, True, HEADER_COLOR)
+        text_surface = self._render_cache.label(text, HEADER_COLOR, True)
         text_x = SCREEN_WIDTH // 2 - 140
         text_y = SCREEN_HEIGHT // 4
         self._window.blit(text_surface, (text_x, text_y))
@@ -95,261 +163,35 @@ class Game(object):
             ),
         )
         # Render the text
-        return_surface = self._text_font.render("Play again", True, TEXT_COLOR)
+        return_surface = self._render_cache.label("Play again")
         return_btn_x = self.single_x + BUTTON_WIDTH // 2 - 60
         return_btn_y = self.multi_y + 70
         self._window.blit(return_surface, (return_btn_x, return_btn_y))
 
     def draw_board(self) -> None:
-        pygame.draw.rect(
-            self._window, BOARD_OUTLINE_COLOR, (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
-        )
-
-        for tile_number in range(ROWS * COLS):
-            row = tile_number // COLS
-            col = tile_number % COLS
-            color = WHITE_TILE_COLOR if (row + col) % 2 == 0 else BLACK_TILE_COLOR
-
-            pygame.draw.rect(
-                self._window,
-                color,
-                (
-                    col * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                    row * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                    TILE_SIZE,
-                    TILE_SIZE,
-                ),
-            )
-
-    def draw_pieces(self) -> None:
-        for tile_number in range(ROWS * COLS):
-            row = tile_number // COLS
-            col = tile_number % COLS
-            piece = self._board.get_piece(tile_number)
-            if piece.is_empty():
-                continue
-
-            color = WHITE_PIECE_COLOR if piece.is_white() else BLACK_PIECE_COLOR
-            shadow = (
-                WHITE_PIECE_SHADOW_COLOR
-                if piece.is_white()
-                else BLACK_PIECE_SHADOW_COLOR
-            )
-
-            # Shadow of piece:
-            pygame.draw.circle(
-                self._window,
-                shadow,
-                (
-                    col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                    row * TILE_SIZE
-                    + TILE_SIZE // 2
-                    + BOARD_OUTLINE_SIZE
-                    + SHADOW_SIZE // 2,
-                ),
-                TILE_SIZE // 2 - 10,
-            )
-            pygame.draw.circle(
-                self._window,
-                color,
-                (
-                    col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                    row * TILE_SIZE
-                    + TILE_SIZE // 2
-                    + BOARD_OUTLINE_SIZE
-                    - SHADOW_SIZE // 2,
-                ),
-                TILE_SIZE // 2 - 10,
-            )
-
-            queen_color = (
-                WHITE_PIECE_SHADOW_COLOR
-                if piece.is_white()
-                else BLACK_PIECE_SHADOW_COLOR
-            )
-
-            # Drawing queen:
-            if piece.is_queen():
-                pygame.draw.circle(
-                    self._window,
-                    queen_color,
-                    (
-                        col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                        row * TILE_SIZE
-                        + TILE_SIZE // 2
-                        + BOARD_OUTLINE_SIZE
-                        - SHADOW_SIZE // 2,
-                    ),
-                    TILE_SIZE // 2 - 15,
-                )
-                pygame.draw.circle(
-                    self._window,
-                    color,
-                    (
-                        col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                        row * TILE_SIZE
-                        + TILE_SIZE // 2
-                        + BOARD_OUTLINE_SIZE
-                        - SHADOW_SIZE // 2,
-                    ),
-                    TILE_SIZE // 2 - 18,
-                )
-
-    def draw_valid_moves(self) -> None:
-        surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        alpha = (80,)
-
-        for move in self._current_turn_moves:
-            move_tile = move.target_tile
-            org_tile = move.start_tile
-
-            row = move_tile // COLS
-            col = move_tile % COLS
-
-            piece = self._board.get_piece(org_tile)
-
-            color = (
-                WHITE_PIECE_COLOR + alpha
-                if piece.is_white()
-                else BLACK_PIECE_COLOR + alpha
-            )
-            shadow = (
-                WHITE_PIECE_SHADOW_COLOR + alpha
-                if piece.is_white()
-                else BLACK_PIECE_SHADOW_COLOR + alpha
-            )
-
-            # Shadow of piece:
-            pygame.draw.circle(
-                surf,
-                shadow,
-                (
-                    col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                    row * TILE_SIZE
-                    + TILE_SIZE // 2
-                    + BOARD_OUTLINE_SIZE
-                    + SHADOW_SIZE // 2,
-                ),
-                TILE_SIZE // 2 - 10,
-            )
-            pygame.draw.circle(
-                surf,
-                color,
-                (
-                    col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                    row * TILE_SIZE
-                    + TILE_SIZE // 2
-                    + BOARD_OUTLINE_SIZE
-                    - SHADOW_SIZE // 2,
-                ),
-                TILE_SIZE // 2 - 10,
-            )
-
-            queen_color = (
-                WHITE_PIECE_SHADOW_COLOR + alpha
-                if piece.is_white()
-                else BLACK_PIECE_SHADOW_COLOR + alpha
-            )
-
-            # Drawing queen:
-            if piece.is_queen():
-                pygame.draw.circle(
-                    surf,
-                    queen_color,
-                    (
-                        col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                        row * TILE_SIZE
-                        + TILE_SIZE // 2
-                        + BOARD_OUTLINE_SIZE
-                        - SHADOW_SIZE // 2,
-                    ),
-                    TILE_SIZE // 2 - 15,
-                )
-                pygame.draw.circle(
-                    surf,
-                    color,
-                    (
-                        col * TILE_SIZE + TILE_SIZE // 2 + BOARD_OUTLINE_SIZE,
-                        row * TILE_SIZE
-                        + TILE_SIZE // 2
-                        + BOARD_OUTLINE_SIZE
-                        - SHADOW_SIZE // 2,
-                    ),
-                    TILE_SIZE // 2 - 18,
-                )
-
-        self._window.blit(surf, (0, 0))
-
-    def draw_selected_tile(self) -> None:
-        if self._selected_piece is None:
-            return
-        row = self._selected_piece // COLS
-        col = self._selected_piece % COLS
-
-        pygame.draw.rect(
-            self._window,
-            SELECTED_TILE_BASE_COLOR,
-            (
-                col * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                row * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                TILE_SIZE,
-                TILE_SIZE,
-            ),
-        )
-
-    def draw_played_move(self) -> None:
-        if self.played_move is None:
-            return
-        # Outline tile on which the piece was moved:
-        start_tile = self.played_move.start_tile
-        start_row = start_tile // COLS
-        start_col = start_tile % COLS
-        # Fill inside of the tile:
-        pygame.draw.rect(
-            self._window,
-            self.selected_color,
-            (
-                start_col * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                start_row * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                TILE_SIZE,
-                TILE_SIZE,
-            ),
-        )
-        pygame.draw.rect(
-            self._window,
-            BLACK_TILE_COLOR,
-            (
-                start_col * TILE_SIZE + BOARD_OUTLINE_SIZE + PLAYED_TILE_OUTLINE_SIZE,
-                start_row * TILE_SIZE + BOARD_OUTLINE_SIZE + PLAYED_TILE_OUTLINE_SIZE,
-                TILE_SIZE - 2 * PLAYED_TILE_OUTLINE_SIZE,
-                TILE_SIZE - 2 * PLAYED_TILE_OUTLINE_SIZE,
-            ),
-        )
-        # Fill inside of the tile:
-        end_tile = self.played_move.target_tile
-        end_row = end_tile // COLS
-        end_col = end_tile % COLS
-        # Outline tile from which the piece was moved:
-        pygame.draw.rect(
-            self._window,
-            self.selected_color,
-            (
-                end_col * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                end_row * TILE_SIZE + BOARD_OUTLINE_SIZE,
-                TILE_SIZE,
-                TILE_SIZE,
-            ),
-        )
-        pygame.draw.rect(
-            self._window,
-            BLACK_TILE_COLOR,
-            (
-                end_col * TILE_SIZE + BOARD_OUTLINE_SIZE + PLAYED_TILE_OUTLINE_SIZE,
-                end_row * TILE_SIZE + BOARD_OUTLINE_SIZE + PLAYED_TILE_OUTLINE_SIZE,
-                TILE_SIZE - 2 * PLAYED_TILE_OUTLINE_SIZE,
-                TILE_SIZE - 2 * PLAYED_TILE_OUTLINE_SIZE,
-            ),
+        self._window.blit(self._render_cache.board, (0, 0))
+
+    def draw_tile(self, tile_number: int, state: tuple) -> pygame.Rect:
+        played_color, selected, piece, ghost = state
+        rect = pygame.Rect(
+            tile_number % COLS * TILE_SIZE + BOARD_OUTLINE_SIZE,
+            tile_number // COLS * TILE_SIZE + BOARD_OUTLINE_SIZE,
+            TILE_SIZE,
+            TILE_SIZE,
         )
+        cache = self._render_cache
+        self._window.blit(cache.board, rect, rect)
+
+        # Outline tiles from and to which the piece was moved:
+        if played_color is not None:
+            self._window.blit(cache.played_tile(played_color), rect)
+        if selected:
+            self._window.blit(cache.selected_tile, rect)
+        if not Piece.is_piece_empty(piece):
+            self._window.blit(cache.pieces[piece], rect)
+        if not Piece.is_piece_empty(ghost):
+            self._window.blit(cache.ghosts[ghost], rect)
+        return rect
 
     def draw_main_menu(self) -> None:
         # Background:
@@ -357,7 +199,7 @@ class Game(object):
             self._window, MAIN_MENU_COLOR, (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
         )
         # Drawing header:
-        header_surface = self._header_font.render("Checkers", True, HEADER_COLOR)
+        header_surface = self._render_cache.label("Checkers", HEADER_COLOR, True)
         header_x = SCREEN_WIDTH // 2 - 130
         header_y = SCREEN_HEIGHT // 10
         self._window.blit(header_surface, (header_x, header_y))
@@ -373,7 +215,7 @@ class Game(object):
             ),
         )
         # Render the text
-        single_surface = self._text_font.render("1 Player", True, TEXT_COLOR)
+        single_surface = self._render_cache.label("1 Player")
         single_btn_x = self.single_x + BUTTON_WIDTH // 2 - 50
         single_btn_y = self.single_y + 20
         self._window.blit(single_surface, (single_btn_x, single_btn_y))
@@ -389,12 +231,12 @@ class Game(object):
             ),
         )
         # Render the text
-        multi_surface = self._text_font.render("2 Player", True, TEXT_COLOR)
+        multi_surface = self._render_cache.label("2 Player")
         multi_btn_x = self.multi_x + BUTTON_WIDTH // 2 - 50
         multi_btn_y = self.multi_y + 20
         self._window.blit(multi_surface, (multi_btn_x, multi_btn_y))
         # Render mode selection text:
-        mode_surface = self._text_font.render("Forced jumping?", True, BUTTON_COLOR)
+        mode_surface = self._render_cache.label("Forced jumping?", BUTTON_COLOR)
         mode_x = self.mode_x + 15
         mode_y = self.mode_y - 45
         self._window.blit(mode_surface, (mode_x, mode_y))
@@ -410,7 +252,7 @@ class Game(object):
             ),
         )
         # Render the YES text:
-        yes_surface = self._text_font.render("YES", True, TEXT_COLOR)
+        yes_surface = self._render_cache.label("YES")
         yes_btn_x = self.mode_x + BUTTON_WIDTH // 4 - 30
         yes_btn_y = self.mode_y + 20
         self._window.blit(yes_surface, (yes_btn_x, yes_btn_y))
@@ -425,7 +267,7 @@ class Game(object):
             ),
         )
         # Render the NO text:
-        no_surface = self._text_font.render("NO", True, TEXT_COLOR)
+        no_surface = self._render_cache.label("NO")
         no_btn_x = self.mode_x + BUTTON_WIDTH // 2 + BUTTON_WIDTH // 4 - 12
         no_btn_y = self.mode_y + 20
         self._window.blit(no_surface, (no_btn_x, no_btn_y))
@@ -442,6 +284,7 @@ class Game(object):
         self.played_move = move
 
     def undo(self):
+        self.cancel_search()
         if self.move_stack:
             move = self.move_stack.pop()
             self.selected_color = UNDO_SELECTED_TILE_COLOR
@@ -485,56 +328,67 @@ class Game(object):
                 self._selected_piece = None
                 self._current_turn_moves = []
 
-    def determine_depth(self) -> int:
-        # Example logic for determining depth:
-        num_pieces = self._board._whites_left + self._board._blacks_left
-        if self.forced_jumping:
-            if num_pieces >= 20:
-                return 6
-            elif num_pieces >= 10:
-                return 7
-            else:
-                return 8
-        else:
-            if num_pieces >= 20:
-                return 5
-            elif num_pieces >= 10:
-                return 6
-            else:
-                return 7
+    @property
+    def is_thinking(self) -> bool:
+        return self._search_future is not None
 
-    def play_next_move(self) -> bool:
-        print("Computer is thinking...")
-        self.start_time = time.time()
+    def cancel_search(self) -> None:
+        if self._search_future is None:
+            return
+        self._search_stop.set()
+        # Stopped search ends after a few nodes, waiting keeps the engine
+        # from being used by two searches at once:
+        if not self._search_future.cancel():
+            self._search_future.result()
+        self._search_future = None
+        self._search_stop = None
+
+    def close(self) -> None:
+        self.cancel_search()
+        self._search_executor.shutdown()
+        self.engine.close()
+        self.opening_book.close()
 
-        # Variable depth depending on pieces left:
-        depth = self.determine_depth()
-        print(f"Using search depth: {depth}")
+    def play_next_move(self) -> bool:
+        # First call starts the search, the next ones check if it is done:
+        if self._search_future is None:
+            self._search_stop = threading.Event()
+            book_result = self.opening_book.probe(
+                self._board, self._turn_color, self.forced_jumping
+            )
+            if book_result is not None:
+                # Known position needs no thinking, the move is played right away:
+                print("Computer plays from the opening book.")
+                self._search_future = Future()
+                self._search_future.set_result(book_result)
+            else:
+                print("Computer is thinking...")
+                # Search gets its own copy, the window keeps drawing this board:
+                self._search_future = self._search_executor.submit(
+                    self.engine.search,
+                    self._board.copy(),
+                    self._turn_color,
+                    self.forced_jumping,
+                    self.search_time_budget,
+                    MAX_SEARCH_DEPTH,
+                    self._search_stop,
+                )
+                return False
+        if not self._search_future.done():
+            return False
 
-        # Save the current state of the board:
-        board = deepcopy(self._board.board)
-        value, move = self.minimax(
-            self._board,
-            depth,
-            float("-inf"),
-            float("inf"),
-            self._turn_color == BLACK_COLOR,
-            self.forced_jumping,
-        )
-        end_time = time.time()
-        elapsed_time = end_time - self.start_time
+        result = self._search_future.result()
+        self._search_future = None
+        self._search_stop = None
+        move = result.move
+        print(f"Reached search depth: {result.depth}")
 
-        # Bring back old board state:
-        self._board.board = board
         # Checking game state:
 
         print(f"Move: {move}")
         if move is not None:
             self.make_move(move)
-            my_moves = self._board.calculate_all_turn_moves(
-                self._turn_color, self.forced_jumping
-            )
-            if not my_moves:
+            if not self._board.has_any_move(self._turn_color):
                 print("Game over! Black won!")
                 self.game_over = True
                 self.show_game = False
@@ -546,65 +400,8 @@ class Game(object):
             self.white_won = True
 
         self.selected_color = SELECTED_TILE_BLACK_COLOR
-        print(f"It took it: {elapsed_time} seconds to find a move.")
-
-    def minimax(
-        self,
-        state: Board,
-        depth: int,
-        alpha: float,
-        beta: float,
-        is_maximising_player: bool,
-        forced_jumping: bool = False,
-    ):
-        state_str = str(state)
-        if state_str not in self.transposition_table:
-            self.transposition_table[state_str] = state.evaluate()
-
-        if time.time() - self.start_time > 3:
-            return self.transposition_table[state_str], None
-
-        if depth == 0 or state.is_game_over():
-            return self.transposition_table[state_str], None
-
-        maximizing = not is_maximising_player
-
-        if is_maximising_player:
-            max_eval = float("-inf")
-            best_move = None
-            for move in state.calculate_all_turn_moves(BLACK_COLOR, forced_jumping):
-                state.make_move(move)
-                eval = self.minimax(
-                    state, depth - 1, alpha, beta, maximizing, forced_jumping
-                )[0]
-                state.undo_move(move)
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-
-            return max_eval, best_move
-        else:
-            min_eval = float("inf")
-            best_move = None
-            for move in state.calculate_all_turn_moves(WHITE_COLOR, forced_jumping):
-                state.make_move(move)
-                eval = self.minimax(
-                    state,
-                    depth - 1,
-                    alpha,
-                    beta,
-                    maximizing,
-                    forced_jumping,
-                )[0]
-                state.undo_move(move)
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-
-            return min_eval, best_move
+        print(f"It took it: {result.elapsed_time} seconds to find a move.")
+        print(f"Searched {result.nodes} nodes.")
+        print(f"Cutoffs on first move: {result.cutoff_on_first_move:.1f}%")
+        print(f"Transposition table: {result.table_stats}")
+        return True
@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from Board import Board
+from Constants import *
+from Engine import Engine, SearchResult
+from TranspositionTable import SharedTranspositionTable
+
+### Worker process state ###
+# Engines of all workers are attached to the same shared table:
+_worker_engine: Engine = None
+_shared_stop = None
+
+
+def _init_worker(table_name: str, table_memory: int, shared_stop) -> None:
+    global _worker_engine, _shared_stop
+    table = SharedTranspositionTable(table_memory, table_name)
+    _worker_engine = Engine(transposition_table=table)
+    _shared_stop = shared_stop
+
+
+def _worker_ready() -> None:
+    pass
+
+
+def _search_position(
+    board: Board,
+    turn_color: int,
+    forced_jumping: bool,
+    time_budget: float,
+    max_depth: int,
+    start_depth: int,
+) -> tuple:
+    engine = _worker_engine
+    board.turn_color = turn_color
+    value, move = engine.iterative_deepening(
+        board,
+        turn_color,
+        forced_jumping,
+        time_budget,
+        max_depth,
+        _shared_stop,
+        start_depth,
+    )
+    return (
+        engine.completed_depth,
+        value,
+        move,
+        engine.nodes,
+        engine.cutoffs,
+        engine.first_move_cutoffs,
+        engine.transposition_table.stats(),
+    )
+
+
+class LazySmpEngine(object):
+    def __init__(
+        self, workers: int = 0, table_memory: int = TRANSPOSITION_TABLE_MEMORY
+    ) -> None:
+        self.workers = workers if workers > 0 else os.cpu_count()
+        self._table_memory = table_memory
+        self.transposition_table = SharedTranspositionTable(table_memory)
+        self._context = multiprocessing.get_context(PROCESS_START_METHOD)
+        self._shared_stop = self._context.Event()
+        self._executor: ProcessPoolExecutor = None
+        self.new_game()
+
+    def new_game(self) -> None:
+        # No search is running, so nobody writes into the table:
+        self.transposition_table.clear()
+        self.completed_depth = 0
+        self.nodes = 0
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.transposition_table.close()
+
+    def start(self) -> None:
+        # Pool should be made by the main thread, before any search runs:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(
+                    self.transposition_table.name,
+                    self._table_memory,
+                    self._shared_stop,
+                ),
+            )
+            # Pool starts its processes when tasks arrive, one task for
+            # every worker starts them all now:
+            for _ in range(self.workers):
+                self._executor.submit(_worker_ready)
+
+    def search(
+        self,
+        board: Board,
+        turn_color: int,
+        forced_jumping: bool = False,
+        time_budget: float = SEARCH_TIME_BUDGET,
+        max_depth: int = MAX_SEARCH_DEPTH,
+        stop_event=None,
+    ) -> SearchResult:
+        start_time = time.time()
+        self.start()
+        executor = self._executor
+        self._shared_stop.clear()
+
+        # All workers search the same position, every second one a ply
+        # deeper, and they help each other only through the shared table:
+        futures = [
+            executor.submit(
+                _search_position,
+                board.copy(),
+                turn_color,
+                forced_jumping,
+                time_budget,
+                max_depth,
+                1 + worker % 2,
+            )
+            for worker in range(self.workers)
+        ]
+
+        # As soon as one worker is done, the others stop too
+        # and report their last completed iteration:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            if done or (stop_event is not None and stop_event.is_set()):
+                self._shared_stop.set()
+
+        # Deepest result wins, on equal depth the earlier worker:
+        results = [future.result() for future in futures]
+        best = max(results, key=lambda result: result[0])
+        depth, value, move = best[0], best[1], best[2]
+        self.completed_depth = depth
+        self.nodes = sum(result[3] for result in results)
+        cutoffs = sum(result[4] for result in results)
+        first_move_cutoffs = sum(result[5] for result in results)
+
+        table_stats = {}
+        for name in ("probes", "hits", "collisions", "stores"):
+            table_stats[name] = sum(result[6][name] for result in results)
+        probes = table_stats["probes"]
+        table_stats["hit_rate"] = table_stats["hits"] / probes if probes else 0.0
+        table_stats["fill"] = self.transposition_table.sample_fill()
+
+        return SearchResult(
+            move,
+            value,
+            depth,
+            self.nodes,
+            time.time() - start_time,
+            100 * first_move_cutoffs / cutoffs if cutoffs else 0.0,
+            table_stats,
+        )
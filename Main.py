@@ -4,14 +4,6 @@ from Constants import *
 from Game import Game
 
 FPS = 60
-pygame.init()
-
-WIN = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Checkers")
-
-# Setting the icon:
-icon = pygame.image.load("./checker-icon.png")
-pygame.display.set_icon(icon)
 
 
 def get_row_col_from_mouse(pos):
@@ -22,33 +14,64 @@ def get_row_col_from_mouse(pos):
 
 
 def main():
+    # Search workers import this module too, so the window is made only here:
+    pygame.init()
+
+    win = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Checkers")
+
+    # Setting the icon:
+    icon = pygame.image.load("./checker-icon.png")
+    pygame.display.set_icon(icon)
+
     run = True
 
-    clock = pygame.time.Clock()
-    game = Game(WIN)
+    game = Game(win)
 
     while run:
-        clock.tick(FPS)
-
+        # Drawing does nothing unless something has changed:
         game.draw()
 
-        if game.show_game and not game.game_over:
-            if game.singleplayer and game.turn_color == BLACK_COLOR:
-                game.play_next_move()
-
-        for event in pygame.event.get():
+        computer_to_move = (
+            game.show_game
+            and not game.game_over
+            and game.singleplayer
+            and game.turn_color == BLACK_COLOR
+        )
+        if computer_to_move and game.play_next_move():
+            continue
+
+        # Loop sleeps until there is an event, only the computer's search
+        # wakes it up FPS times a second to check if the move is ready:
+        if computer_to_move:
+            events = [pygame.event.wait(1000 // FPS)]
+        else:
+            events = [pygame.event.wait()]
+        events += pygame.event.get()
+
+        for event in events:
             if event.type == pygame.QUIT:
                 run = False
 
+            # Only changed tiles are drawn, so uncovered window needs all of them:
+            if event.type == pygame.VIDEOEXPOSE:
+                game.invalidate()
+
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 3:
                     if game.show_game:
+                        # Undo while computer is thinking takes back
+                        # only the player's move, search is cancelled:
+                        thinking = game.is_thinking
                         game.undo()
-                        if game.singleplayer:
+                        if game.singleplayer and not thinking:
                             game.undo()
                 elif event.button == 1:
                     cords = pygame.mouse.get_pos()
                     if game.show_game:
+                        # Board is not ours while computer is thinking:
+                        if game.is_thinking:
+                            continue
                         cords = get_row_col_from_mouse(cords)
                         game.select_piece(cords)
                     elif game.game_over:
@@ -104,6 +127,7 @@ def main():
                             game.forced_jumping = False
                             continue
 
+    game.close()
     pygame.quit()
 
 
@@ -1,49 +1,54 @@
 class Move(object):
+    # Moves are created by the thousand during search, so they are kept small:
+    __slots__ = ("start_tile", "target_tile", "eaten_tiles", "captured", "key")
+
     def __init__(
         self,
         start_tile: int,
         target_tile: int,
-        eaten_tiles: list[tuple[int, int]] = [],
+        eaten_tiles: tuple[tuple[int, int], ...] = (),
+        captured: int = None,
     ) -> None:
-        self._start_tile: int = start_tile
-        self._target_tile: int = target_tile
-        self._eaten_tiles: list[tuple[int, int]] = eaten_tiles
+        self.start_tile: int = start_tile
+        self.target_tile: int = target_tile
+        # Eaten (tile, piece type) pairs in the order they are jumped over:
+        self.eaten_tiles: tuple[tuple[int, int], ...] = tuple(eaten_tiles)
+        # Same pieces as a mask of board squares, made from the eaten tiles
+        # unless given (dark tile t is board square t // 2):
+        if captured is None:
+            captured = 0
+            for tile, _ in self.eaten_tiles:
+                captured |= 1 << tile // 2
+        self.captured: int = captured
+        # Start, target and eaten pieces packed into one number,
+        # so different jumps between the same tiles stay different moves:
+        self.key: int = start_tile | target_tile << 6 | captured << 12
 
     def __str__(self) -> str:
-        return f"{self._start_tile} => {self._target_tile}: {self._eaten_tiles}"
+        eaten = list(self.eaten_tiles)
+        # Moves made from a key only know the captured squares, square s
+        # is in row s // 4 and rows start with a light tile every other row:
+        if not eaten and self.captured:
+            eaten = [
+                2 * square + (square // 4 + 1) % 2
+                for square in range(32)
+                if self.captured >> square & 1
+            ]
+        return f"{self.start_tile} => {self.target_tile}: {eaten}"
 
     def __repr__(self) -> str:
         return self.__str__()
 
     def __eq__(self, other) -> bool:
-        return (
-            self.start_tile == other.start_tile
-            and self.target_tile == other.target_tile
-        )
+        if not isinstance(other, Move):
+            return NotImplemented
+        return self.key == other.key
 
     def __hash__(self) -> int:
-        return hash((self.start_tile, self.target_tile))
-
-    @property
-    def start_tile(self):
-        return self._start_tile
-
-    @start_tile.setter
-    def start_tile(self, start_tile: tuple):
-        self._start_tile = start_tile
-
-    @property
-    def target_tile(self):
-        return self._target_tile
-
-    @target_tile.setter
-    def target_tile(self, target_tile: tuple):
-        self._target_tile = target_tile
-
-    @property
-    def eaten_tiles(self):
-        return self._eaten_tiles
+        return hash(self.key)
 
-    @eaten_tiles.setter
-    def eaten_tiles(self, eaten_tiles: list):
-        self._eaten_tiles = eaten_tiles
+    @staticmethod
+    def from_key(key: int) -> "Move":
+        # Only start, target and captured squares are known, which is enough
+        # to find the move among the generated ones:
+        return Move(key & 63, key >> 6 & 63, (), key >> 12)
@@ -0,0 +1,190 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+
+from Board import ZOBRIST_BLACK_TO_MOVE, Board
+from Constants import *
+from Engine import Engine, SearchResult
+from Move import Move
+
+### File format ###
+# Header is followed by fixed size records sorted by their key, so a move
+# is found by binary search right in the mapped file. Record holds the key
+# of the position, key of the best move (so different capture paths
+# between the same tiles stay apart) and its score in halves
+# (all evaluation weights are halves).
+OPENING_BOOK_MAGIC = b"CKOB"
+OPENING_BOOK_VERSION = 2
+_HEADER = struct.Struct("<4sB")
+_RECORD = struct.Struct("<QQh")
+_SCORE_LIMIT = 2**15 - 1
+
+# Positions are the same under both rules, but their best moves aren't:
+_FORCED_JUMPING_KEY = random.Random(0x6F70656E696E6773).getrandbits(64)
+
+
+def book_key(board: Board, turn_color: int, forced_jumping: bool) -> int:
+    key = board.hash
+    # Board may not know whose turn it is, the key has to:
+    if board.turn_color != turn_color:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    return key ^ (_FORCED_JUMPING_KEY if forced_jumping else 0)
+
+
+class OpeningBook(object):
+    def __init__(self, path: str = OPENING_BOOK_PATH) -> None:
+        # Mapping the file costs nothing, only the probed pages are read:
+        self._book: mmap.mmap = None
+        self._records = 0
+        if not os.path.isfile(path) or os.path.getsize(path) <= _HEADER.size:
+            return
+        with open(path, "rb") as file:
+            self._book = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _HEADER.unpack_from(self._book)
+        body = len(self._book) - _HEADER.size
+        # Book is only a speed-up, an old or broken one is left out:
+        if (
+            magic != OPENING_BOOK_MAGIC
+            or version != OPENING_BOOK_VERSION
+            or body % _RECORD.size
+        ):
+            self.close()
+            print(f"Ignoring {path}, it is not an opening book of this version.")
+            return
+        self._records = body // _RECORD.size
+
+    def __len__(self) -> int:
+        return self._records
+
+    def close(self) -> None:
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+        self._records = 0
+
+    def _find(self, key: int):
+        low, high = 0, self._records
+        while low < high:
+            middle = (low + high) // 2
+            offset = _HEADER.size + middle * _RECORD.size
+            record = _RECORD.unpack_from(self._book, offset)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                return record
+        return None
+
+    def probe(
+        self, board: Board, turn_color: int, forced_jumping: bool = False
+    ) -> SearchResult:
+        # Result looks like the one of a search, None if the position is unknown:
+        if not self._records:
+            return None
+        record = self._find(book_key(board, turn_color, forced_jumping))
+        if record is None:
+            return None
+        _, move_key, score = record
+
+        # Book keeps only the key of the move, so the move is taken from the
+        # generated ones, which also guards against a stale book:
+        move = board.find_move(Move.from_key(move_key), turn_color, forced_jumping)
+        if move is None:
+            return None
+        return SearchResult(move, score / 2, 0, 0, 0.0, 0.0, {})
+
+
+### Building ###
+def build(
+    path: str, plies: int, depth: int, forced_modes: list[bool]
+) -> dict[int, tuple]:
+    # Every position up to the given number of moves into the game
+    # is searched once, transpositions are searched only the first time:
+    engine = Engine()
+    entries = {}
+    for forced_jumping in forced_modes:
+        board = Board()
+        positions = [board]
+        for ply in range(plies):
+            start_time = time.perf_counter()
+            next_positions = []
+            for board in positions:
+                turn_color = board.turn_color
+                key = book_key(board, turn_color, forced_jumping)
+                if key in entries:
+                    continue
+                engine.new_game()
+                result = engine.search(
+                    board.copy(),
+                    turn_color,
+                    forced_jumping,
+                    time_budget=float("inf"),
+                    max_depth=depth,
+                )
+                if result.move is None:
+                    continue
+                # Won and lost positions are infinite, so clamping goes first:
+                score = round(max(-_SCORE_LIMIT, min(_SCORE_LIMIT, 2 * result.value)))
+                entries[key] = (result.move.key, score)
+
+                for move in board.calculate_all_turn_moves(turn_color, forced_jumping):
+                    next_board = board.copy()
+                    next_board.make_move(move)
+                    next_positions.append(next_board)
+            rule = "on" if forced_jumping else "off"
+            print(
+                f"forced jumping {rule}, ply {ply}: {len(entries)} positions "
+                f"({time.perf_counter() - start_time:.1f}s)"
+            )
+            positions = next_positions
+    engine.close()
+
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(OPENING_BOOK_MAGIC, OPENING_BOOK_VERSION))
+        for key in sorted(entries):
+            file.write(_RECORD.pack(key, *entries[key]))
+    return entries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Builds the opening book with deep searches of early positions."
+    )
+    parser.add_argument(
+        "-p",
+        "--plies",
+        type=int,
+        default=OPENING_BOOK_PLIES,
+        help=f"moves into the game the book covers (default: {OPENING_BOOK_PLIES})",
+    )
+    parser.add_argument(
+        "-d",
+        "--depth",
+        type=int,
+        default=OPENING_BOOK_DEPTH,
+        help=f"search depth (default: {OPENING_BOOK_DEPTH})",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=OPENING_BOOK_PATH,
+        help=f"book file (default: {OPENING_BOOK_PATH})",
+    )
+    parser.add_argument(
+        "--forced",
+        choices=list(FORCED_JUMPING_MODES),
+        default="both",
+        help="forced jumping rule",
+    )
+    args = parser.parse_args()
+    forced_modes = FORCED_JUMPING_MODES[args.forced]
+    entries = build(args.output, args.plies, args.depth, forced_modes)
+    print(f"{len(entries)} positions written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from Board import Board
+from Constants import *
+from Engine import Engine
+from Move import Move
+from Tablebase import Tablebase
+from TranspositionTable import EXACT
+
+# Engine in the main process only keeps the root of every iteration,
+# the workers search everything else:
+ROOT_TABLE_MEMORY = 1024 * 1024
+
+### Worker process state ###
+# Every worker keeps its own engine, so its table lives between tasks:
+_worker_engine: "RootMoveEngine" = None
+_worker_game: int = -1
+# Best root value and index of its move, shared by all workers:
+_shared_bound = None
+_shared_stop = None
+
+
+def _init_worker(
+    shared_bound, shared_stop, table_memory: int, tablebase_directory: str
+) -> None:
+    global _worker_engine, _shared_bound, _shared_stop
+    _worker_engine = RootMoveEngine(
+        table_memory, tablebase=Tablebase(tablebase_directory)
+    )
+    _shared_bound = shared_bound
+    _shared_stop = shared_stop
+
+
+def _worker_ready() -> None:
+    pass
+
+
+def _is_better(
+    value: float, index: int, best: float, best_index: int, maximising: bool
+) -> bool:
+    # Ties go to the move that comes first in the root order,
+    # just like in serial search:
+    if value == best:
+        return index < best_index
+    return value > best if maximising else value < best
+
+
+def _root_window(move_index: int, is_maximising_player: bool) -> tuple[float, float]:
+    with _shared_bound.get_lock():
+        bound, bound_index = _shared_bound[0], int(_shared_bound[1])
+
+    # Moves before the current best one must beat it or tie with it
+    # to be chosen, so they get a window that keeps ties exact:
+    alpha, beta = float("-inf"), float("inf")
+    if is_maximising_player:
+        alpha = bound if move_index > bound_index else math.nextafter(bound, alpha)
+    else:
+        beta = bound if move_index > bound_index else math.nextafter(bound, beta)
+    return alpha, beta
+
+
+class RootMoveEngine(Engine):
+    # Searches a single root move in a worker. Its window comes from the
+    # best root value of all workers, and when another worker improves
+    # that value the search starts over with the narrower window:
+    def search_move(
+        self,
+        board: Board,
+        move: Move,
+        move_index: int,
+        depth: int,
+        is_maximising_player: bool,
+        forced_jumping: bool,
+        deadline: float,
+    ) -> float:
+        self.begin_search(deadline - time.time(), _shared_stop)
+        self._move_index = move_index
+        self._is_maximising_player = is_maximising_player
+
+        board.make_move(move)
+        while True:
+            self._window = _root_window(move_index, is_maximising_player)
+            self._window_changed = False
+            value = self.minimax(
+                board,
+                depth - 1,
+                self._window[0],
+                self._window[1],
+                not is_maximising_player,
+                forced_jumping,
+                1,
+            )[0]
+            if not self._timed_out:
+                break
+            # Out of time, the move stays unfinished:
+            if not self._window_changed:
+                value = None
+                break
+            # Table still holds most of the work done so far:
+            self._timed_out = False
+        board.undo_move(move)
+        return value
+
+    def should_stop(self) -> bool:
+        if Engine.should_stop(self):
+            return True
+        self._window_changed = self._window != _root_window(
+            self._move_index, self._is_maximising_player
+        )
+        return self._window_changed
+
+
+def _search_root_move(
+    game: int,
+    board: Board,
+    move: Move,
+    move_index: int,
+    depth: int,
+    is_maximising_player: bool,
+    forced_jumping: bool,
+    deadline: float,
+) -> tuple:
+    global _worker_game
+    engine = _worker_engine
+    if game != _worker_game:
+        engine.new_game()
+        _worker_game = game
+
+    value = engine.search_move(
+        board,
+        move,
+        move_index,
+        depth,
+        is_maximising_player,
+        forced_jumping,
+        deadline,
+    )
+    stats = (
+        engine.nodes,
+        engine.cutoffs,
+        engine.first_move_cutoffs,
+        engine.transposition_table.stats(),
+    )
+    if value is None:
+        return move_index, None, stats
+
+    with _shared_bound.get_lock():
+        if _is_better(
+            value,
+            move_index,
+            _shared_bound[0],
+            int(_shared_bound[1]),
+            is_maximising_player,
+        ):
+            _shared_bound[0] = value
+            _shared_bound[1] = move_index
+    return move_index, value, stats
+
+
+class ParallelEngine(Engine):
+    # Iterative deepening and the root move order are the ones of Engine,
+    # only the root moves of every iteration are split between processes:
+    def __init__(
+        self,
+        workers: int = 0,
+        table_memory: int = TRANSPOSITION_TABLE_MEMORY,
+        tablebase_directory: str = TABLEBASE_DIRECTORY,
+    ) -> None:
+        self.workers = workers if workers > 0 else os.cpu_count()
+        # Every worker gets its own share of the memory:
+        self._table_memory = table_memory // self.workers
+        self._tablebase_directory = tablebase_directory
+        self._context = multiprocessing.get_context(PROCESS_START_METHOD)
+        self._shared_bound = self._context.Array("d", 2)
+        self._shared_stop = self._context.Event()
+        self._executor: ProcessPoolExecutor = None
+        self._game = 0
+        self._table_stats = {}
+        Engine.__init__(
+            self, ROOT_TABLE_MEMORY, tablebase=Tablebase(tablebase_directory)
+        )
+
+    def new_game(self) -> None:
+        # Workers clear their tables when they see a new game number:
+        self._game += 1
+        Engine.new_game(self)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        Engine.close(self)
+
+    def start(self) -> None:
+        # Pool should be made by the main thread, before any search runs:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(
+                    self._shared_bound,
+                    self._shared_stop,
+                    self._table_memory,
+                    self._tablebase_directory,
+                ),
+            )
+            # Pool starts its processes when tasks arrive, one task for
+            # every worker starts them all now:
+            for _ in range(self.workers):
+                self._executor.submit(_worker_ready)
+
+    def begin_search(self, time_budget: float, stop_event=None) -> None:
+        Engine.begin_search(self, time_budget, stop_event)
+        self._shared_stop.clear()
+        self._table_stats = {}
+
+    def table_stats(self) -> dict:
+        return self._table_stats
+
+    def search_root(
+        self,
+        board: Board,
+        moves: list[Move],
+        depth: int,
+        is_maximising_player: bool,
+        forced_jumping: bool = False,
+    ) -> tuple[float, Move]:
+        self.start()
+        executor = self._executor
+        with self._shared_bound.get_lock():
+            self._shared_bound[0] = (
+                float("-inf") if is_maximising_player else float("inf")
+            )
+            self._shared_bound[1] = len(moves)
+
+        # Workers get the deadline itself, a task may wait in the queue
+        # for a while before it starts:
+        def submit(move_index: int):
+            return executor.submit(
+                _search_root_move,
+                self._game,
+                board,
+                moves[move_index],
+                move_index,
+                depth,
+                is_maximising_player,
+                forced_jumping,
+                self._deadline,
+            )
+
+        # Young brothers wait: the first move gives a good bound
+        # before all the others are searched at once:
+        pending = {submit(0)}
+        remaining = list(range(1, len(moves)))
+        finished = True
+        best_value, best_index = None, None
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            if self.should_stop():
+                self._shared_stop.set()
+            for future in done:
+                move_index, value, stats = future.result()
+                self._add_stats(stats)
+                if value is None:
+                    finished = False
+                elif best_index is None or _is_better(
+                    value, move_index, best_value, best_index, is_maximising_player
+                ):
+                    best_value, best_index = value, move_index
+            if remaining and best_index is not None and finished:
+                pending |= {submit(move_index) for move_index in remaining}
+                remaining = []
+
+        if not finished or remaining:
+            self._timed_out = True
+            return None, None
+        # Root value is exact, so the principal variation can start from it:
+        self.transposition_table.store(
+            board.hash, depth, best_value, EXACT, moves[best_index]
+        )
+        return best_value, moves[best_index]
+
+    def _add_stats(self, stats: tuple) -> None:
+        nodes, cutoffs, first_move_cutoffs, table_stats = stats
+        self.nodes += nodes
+        self.cutoffs += cutoffs
+        self.first_move_cutoffs += first_move_cutoffs
+        for name in ("probes", "hits", "collisions", "stores"):
+            self._table_stats[name] = self._table_stats.get(name, 0) + table_stats[name]
+        probes = self._table_stats["probes"]
+        self._table_stats["hit_rate"] = (
+            self._table_stats["hits"] / probes if probes else 0.0
+        )
+        self._table_stats["fill"] = max(
+            self._table_stats.get("fill", 0.0), table_stats["fill"]
+        )
@@ -0,0 +1,238 @@
+import argparse
+import sys
+import time
+
+from Board import Board
+from Constants import *
+
+# Positions are written as diagrams, in the same format as str(board):
+PERFT_POSITIONS = {
+    "start": (
+        """
+        .b.b.b.b
+        b.b.b.b.
+        .b.b.b.b
+        ........
+        ........
+        w.w.w.w.
+        .w.w.w.w
+        w.w.w.w.
+        """,
+        WHITE_COLOR,
+    ),
+    # Two different double jumps end on the same tile:
+    "multi_jump": (
+        """
+        ........
+        ........
+        ...b.b..
+        ........
+        ...b.b..
+        ....w...
+        .w......
+        ........
+        """,
+        WHITE_COLOR,
+    ),
+    # Queen can jump in every direction and continue with regular pieces:
+    "queen_capture": (
+        """
+        .......b
+        ..b.....
+        ........
+        ..b.b...
+        ...W....
+        ..b.b...
+        .......w
+        ........
+        """,
+        WHITE_COLOR,
+    ),
+    # Queen jumps around in a ring and would end where it started:
+    "queen_ring": (
+        """
+        ........
+        ........
+        ........
+        ..b.b...
+        ........
+        ..b.b...
+        ...W....
+        ........
+        """,
+        WHITE_COLOR,
+    ),
+    # Black queens can be taken while black is still promoting:
+    "queen_endgame": (
+        """
+        .B......
+        ........
+        .....b..
+        ......W.
+        .w......
+        ..B.....
+        ........
+        ..W.....
+        """,
+        BLACK_COLOR,
+    ),
+}
+
+# Leaf counts for every depth, starting with depth 0:
+EXPECTED_NODES = {
+    ("start", False): [1, 7, 49, 379, 2872, 23582, 190647],
+    ("start", True): [1, 7, 49, 302, 1469, 7361, 37205, 182906],
+    ("multi_jump", False): [1, 6, 36, 134, 630, 1977, 9324, 29441],
+    ("multi_jump", True): [1, 4, 10, 33, 106, 339, 1241, 4736],
+    ("queen_capture", False): [1, 6, 52, 257, 2092, 9318, 74761],
+    ("queen_capture", True): [1, 5, 35, 153, 1088, 3904, 24615],
+    ("queen_ring", False): [1, 8, 40, 122, 526, 1870, 8682, 27413],
+    ("queen_ring", True): [1, 6, 14, 36, 88, 308, 839, 2662],
+    ("queen_endgame", False): [1, 8, 58, 432, 3050, 22299, 160952],
+    ("queen_endgame", True): [1, 2, 5, 22, 75, 316, 1258, 5515],
+}
+
+
+def create_board(position_name: str) -> Board:
+    return Board.from_position(*PERFT_POSITIONS[position_name])
+
+
+def perft(
+    board: Board, depth: int, forced_jumping: bool, validate: bool = False
+) -> int:
+    if depth == 0:
+        return 1
+
+    moves = board.calculate_all_turn_moves(board.turn_color, forced_jumping)
+    if depth == 1 and not validate:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        if validate:
+            before = (
+                board.white,
+                board.black,
+                board.queens,
+                board.hash,
+                board.placement,
+            )
+        board.make_move(move)
+        if validate and board.hash != board.compute_hash():
+            raise RuntimeError(f"Hash is wrong after {move} in {board}")
+        if validate and board.placement != board.compute_placement():
+            raise RuntimeError(f"Placement score is wrong after {move} in {board}")
+        nodes += perft(board, depth - 1, forced_jumping, validate)
+        board.undo_move(move)
+        if validate:
+            after = (
+                board.white,
+                board.black,
+                board.queens,
+                board.hash,
+                board.placement,
+            )
+            if before != after:
+                raise RuntimeError(f"Undo of {move} didn't restore {board}")
+    return nodes
+
+
+def divide(board: Board, depth: int, forced_jumping: bool) -> dict:
+    # Leaf counts split by the root move:
+    counts = {}
+    for move in board.calculate_all_turn_moves(board.turn_color, forced_jumping):
+        board.make_move(move)
+        counts[move] = perft(board, depth - 1, forced_jumping)
+        board.undo_move(move)
+    return counts
+
+
+def run(
+    position_names: list[str],
+    max_depth: int,
+    forced_modes: list[bool],
+    show_divide: bool = False,
+    validate: bool = False,
+) -> bool:
+    # Prints every count and returns False if any of them is unexpected:
+    all_correct = True
+    for position_name in position_names:
+        for forced_jumping in forced_modes:
+            expected = EXPECTED_NODES.get((position_name, forced_jumping), [])
+            rule = "on" if forced_jumping else "off"
+            print(f"{position_name}, forced jumping {rule}:")
+            # Without a depth we go as deep as the stored counts go:
+            depth_limit = max_depth if max_depth else len(expected) - 1
+            # Every count leaves the board as it was:
+            board = create_board(position_name)
+            for depth in range(1, depth_limit + 1):
+                start_time = time.perf_counter()
+                nodes = perft(board, depth, forced_jumping, validate)
+                elapsed_time = time.perf_counter() - start_time
+                nodes_per_second = nodes / elapsed_time if elapsed_time > 0 else 0
+
+                status = ""
+                if depth < len(expected):
+                    if nodes == expected[depth]:
+                        status = "ok"
+                    else:
+                        status = f"expected {expected[depth]}"
+                        all_correct = False
+                print(
+                    f"  depth {depth}: {nodes} nodes in {elapsed_time:.3f}s "
+                    f"({nodes_per_second:.0f} nodes/s) {status}"
+                )
+
+            if show_divide and depth_limit >= 1:
+                counts = divide(board, depth_limit, forced_jumping)
+                for move, nodes in counts.items():
+                    print(f"    {move}: {nodes}")
+    return all_correct
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Counts leaf nodes of the move tree to check the move generator."
+    )
+    parser.add_argument(
+        "positions",
+        nargs="*",
+        help=f"positions to count: {', '.join(PERFT_POSITIONS)} (default: all)",
+    )
+    parser.add_argument(
+        "-d",
+        "--depth",
+        type=int,
+        default=0,
+        help="deepest count (default: as deep as the stored counts)",
+    )
+    parser.add_argument(
+        "--forced",
+        choices=list(FORCED_JUMPING_MODES),
+        default="both",
+        help="forced jumping rule",
+    )
+    parser.add_argument(
+        "--divide", action="store_true", help="split the counts by root move"
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="check hashing and undo after every move (slow)",
+    )
+    args = parser.parse_args()
+    for position_name in args.positions:
+        if position_name not in PERFT_POSITIONS:
+            parser.error(f"unknown position: {position_name}")
+    if args.depth < 0:
+        parser.error(f"depth can't be negative: {args.depth}")
+
+    forced_modes = FORCED_JUMPING_MODES[args.forced]
+    position_names = args.positions or list(PERFT_POSITIONS)
+    if not run(position_names, args.depth, forced_modes, args.divide, args.validate):
+        print("Some counts are not as expected!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
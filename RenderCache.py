@@ -0,0 +1,104 @@
+import pygame
+
+from Constants import *
+from Piece import Piece
+
+# Valid moves are shown as see-through pieces:
+GHOST_ALPHA = 80
+
+
+class RenderCache(object):
+    # Everything that looks the same every time it is drawn is made once,
+    # in the pixel format of the display, so drawing is just a few blits.
+    # Display mode has to be set before this is created.
+    def __init__(self) -> None:
+        self._text_font = pygame.font.SysFont("Arial", TEXT_SIZE)
+        self._header_font = pygame.font.SysFont("Arial", HEADER_SIZE)
+        self.board = self._create_board()
+        self.selected_tile = self._create_tile(SELECTED_TILE_BASE_COLOR)
+        self.pieces = {}
+        self.ghosts = {}
+        for piece in (WHITE_PIECE, BLACK_PIECE, WHITE_QUEEN, BLACK_QUEEN):
+            self.pieces[piece] = self._create_piece(piece, ())
+            self.ghosts[piece] = self._create_piece(piece, (GHOST_ALPHA,))
+        # Played move and text surfaces are made the first time they are needed:
+        self._played_tiles = {}
+        self._labels = {}
+
+    def _create_board(self) -> pygame.Surface:
+        surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        surface.fill(BOARD_OUTLINE_COLOR)
+        for tile_number in range(ROWS * COLS):
+            row = tile_number // COLS
+            col = tile_number % COLS
+            color = WHITE_TILE_COLOR if (row + col) % 2 == 0 else BLACK_TILE_COLOR
+            pygame.draw.rect(
+                surface,
+                color,
+                (
+                    col * TILE_SIZE + BOARD_OUTLINE_SIZE,
+                    row * TILE_SIZE + BOARD_OUTLINE_SIZE,
+                    TILE_SIZE,
+                    TILE_SIZE,
+                ),
+            )
+        return surface.convert()
+
+    def _create_tile(self, color: tuple) -> pygame.Surface:
+        surface = pygame.Surface((TILE_SIZE, TILE_SIZE))
+        surface.fill(color)
+        return surface.convert()
+
+    def _create_piece(self, piece: int, alpha: tuple) -> pygame.Surface:
+        surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+        x = y = TILE_SIZE // 2
+        if Piece.is_piece_white(piece):
+            color = WHITE_PIECE_COLOR + alpha
+            shadow = WHITE_PIECE_SHADOW_COLOR + alpha
+        else:
+            color = BLACK_PIECE_COLOR + alpha
+            shadow = BLACK_PIECE_SHADOW_COLOR + alpha
+
+        # Shadow of piece:
+        pygame.draw.circle(
+            surface, shadow, (x, y + SHADOW_SIZE // 2), TILE_SIZE // 2 - 10
+        )
+        pygame.draw.circle(
+            surface, color, (x, y - SHADOW_SIZE // 2), TILE_SIZE // 2 - 10
+        )
+
+        # Drawing queen:
+        if Piece.is_piece_queen(piece):
+            pygame.draw.circle(
+                surface, shadow, (x, y - SHADOW_SIZE // 2), TILE_SIZE // 2 - 15
+            )
+            pygame.draw.circle(
+                surface, color, (x, y - SHADOW_SIZE // 2), TILE_SIZE // 2 - 18
+            )
+        return surface.convert_alpha()
+
+    def played_tile(self, color: tuple) -> pygame.Surface:
+        # Tile outlined with the color of the player that moved:
+        if color not in self._played_tiles:
+            surface = self._create_tile(color)
+            pygame.draw.rect(
+                surface,
+                BLACK_TILE_COLOR,
+                (
+                    PLAYED_TILE_OUTLINE_SIZE,
+                    PLAYED_TILE_OUTLINE_SIZE,
+                    TILE_SIZE - 2 * PLAYED_TILE_OUTLINE_SIZE,
+                    TILE_SIZE - 2 * PLAYED_TILE_OUTLINE_SIZE,
+                ),
+            )
+            self._played_tiles[color] = surface
+        return self._played_tiles[color]
+
+    def label(
+        self, text: str, color: tuple = TEXT_COLOR, header: bool = False
+    ) -> pygame.Surface:
+        key = (text, color, header)
+        if key not in self._labels:
+            font = self._header_font if header else self._text_font
+            self._labels[key] = font.render(text, True, color).convert_alpha()
+        return self._labels[key]
@@ -0,0 +1,417 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+from array import array
+from itertools import combinations, product
+from math import comb
+
+from Board import BOTTOM_ROW_MASK, SQUARES, TOP_ROW_MASK, Board, iterate_bits
+from Constants import *
+
+### File format ###
+# Header is followed by one byte for every index of the material signature.
+# Byte 0 is a draw, otherwise byte - 1 is the distance in plies to the end
+# of the game: even distance is a loss and odd one a win for the side to move.
+TABLEBASE_MAGIC = b"CKTB"
+TABLEBASE_VERSION = 1
+_HEADER = struct.Struct("<4sBBBBBB")
+MAX_DISTANCE = 254
+
+# Only white to move is stored. Turning the board around maps square s
+# to 31 - s, so black to move is the same as white to move in a position
+# with reversed bits and swapped colors.
+# Reversed 16-bit halves are looked up in a table built on first use,
+# so importing the engine doesn't pay for it:
+_reversed_halves: list[int] = None
+
+
+def _build_reversed_halves() -> list[int]:
+    reversed_bytes = [0] * 256
+    for byte in range(256):
+        for bit in range(8):
+            if byte >> bit & 1:
+                reversed_bytes[byte] |= 1 << (7 - bit)
+    return [
+        reversed_bytes[half & 255] << 8 | reversed_bytes[half >> 8]
+        for half in range(1 << 16)
+    ]
+
+
+def flip_bitboard(bb: int) -> int:
+    global _reversed_halves
+    if _reversed_halves is None:
+        _reversed_halves = _build_reversed_halves()
+    return _reversed_halves[bb & 0xFFFF] << 16 | _reversed_halves[bb >> 16]
+
+
+### Indexing ###
+# Signature is (white men, white queens, black men, black queens) and every
+# group of pieces is indexed by the combination of squares it stands on.
+# Men never stand on the row where they would be promoted:
+WHITE_MEN_SQUARES = [s for s in range(SQUARES) if not 1 << s & TOP_ROW_MASK]
+BLACK_MEN_SQUARES = [s for s in range(SQUARES) if not 1 << s & BOTTOM_ROW_MASK]
+QUEEN_SQUARES = list(range(SQUARES))
+_GROUP_SQUARES = (WHITE_MEN_SQUARES, QUEEN_SQUARES, BLACK_MEN_SQUARES, QUEEN_SQUARES)
+_SQUARE_INDEXES = [
+    {square: i for i, square in enumerate(squares)} for squares in _GROUP_SQUARES
+]
+
+
+def signature_of(white: int, black: int, queens: int) -> tuple[int, int, int, int]:
+    return (
+        (white & ~queens).bit_count(),
+        (white & queens).bit_count(),
+        (black & ~queens).bit_count(),
+        (black & queens).bit_count(),
+    )
+
+
+def flip_signature(signature: tuple) -> tuple:
+    return signature[2], signature[3], signature[0], signature[1]
+
+
+def signature_sizes(signature: tuple) -> list[int]:
+    return [
+        comb(len(squares), count) for squares, count in zip(_GROUP_SQUARES, signature)
+    ]
+
+
+def _group_rank(group: int, pieces: int) -> int:
+    # Combinations are ranked in colex order, lowest square first:
+    indexes = _SQUARE_INDEXES[group]
+    rank = 0
+    for i, bit in enumerate(iterate_bits(pieces)):
+        rank += comb(indexes[bit.bit_length() - 1], i + 1)
+    return rank
+
+
+def position_index(white: int, black: int, queens: int, signature: tuple) -> int:
+    groups = (white & ~queens, white & queens, black & ~queens, black & queens)
+    index = 0
+    for group, (pieces, size) in enumerate(zip(groups, signature_sizes(signature))):
+        index = index * size + _group_rank(group, pieces)
+    return index
+
+
+def table_name(signature: tuple, forced_jumping: bool) -> str:
+    rule = "forced" if forced_jumping else "free"
+    return f"{''.join(map(str, signature))}-{rule}.tb"
+
+
+### Probing ###
+class Tablebase(object):
+    def __init__(self, directory: str = TABLEBASE_DIRECTORY) -> None:
+        # Tables are mapped into memory, so opening them costs nothing
+        # and the pages are only read when a position is probed.
+        # No directory gives a tablebase without tables:
+        self._tables: dict[tuple, mmap.mmap] = {}
+        self.max_pieces = 0
+        if directory is None or not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".tb"):
+                continue
+            # Tables are only a speed-up, a broken one is left out:
+            table = self._open_table(os.path.join(directory, name))
+            if table is None:
+                print(f"Skipping {name}, it is not a complete tablebase.")
+                continue
+            magic, version, *signature, forced_jumping = _HEADER.unpack_from(table)
+            self._tables[(tuple(signature), bool(forced_jumping))] = table
+            self.max_pieces = max(self.max_pieces, sum(signature))
+
+    def _open_table(self, path: str):
+        # Returns the mapped table, None if the file isn't a whole table
+        # of this version:
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < _HEADER.size:
+                return None
+            table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *signature, forced_jumping = _HEADER.unpack_from(table)
+        if (
+            magic != TABLEBASE_MAGIC
+            or version != TABLEBASE_VERSION
+            or size != _HEADER.size + _table_size(signature)
+        ):
+            table.close()
+            return None
+        return table
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def close(self) -> None:
+        for table in self._tables.values():
+            table.close()
+        self._tables = {}
+        self.max_pieces = 0
+
+    def probe_distance(
+        self, white: int, black: int, queens: int, turn_color: int, forced: bool
+    ):
+        # Returns the stored byte for the side to move, None if there is no table:
+        if turn_color == BLACK_COLOR:
+            white, black = flip_bitboard(black), flip_bitboard(white)
+            queens = flip_bitboard(queens)
+        signature = signature_of(white, black, queens)
+        table = self._tables.get((signature, forced))
+        if table is None:
+            return None
+        return table[_HEADER.size + position_index(white, black, queens, signature)]
+
+    def probe(self, board: Board, forced_jumping: bool):
+        # Score from the black point of view like Board.evaluate,
+        # shorter wins are better, draws are even:
+        white, black = board.white, board.black
+        if (white | black).bit_count() > self.max_pieces or not white or not black:
+            return None
+        turn_color = board.turn_color
+        value = self.probe_distance(
+            white, black, board.queens, turn_color, forced_jumping
+        )
+        if value is None:
+            return None
+        if value == 0:
+            return 0
+        distance = value - 1
+        score = TABLEBASE_WIN_SCORE - distance
+        side_to_move_won = distance % 2 == 1
+        if side_to_move_won == (turn_color == BLACK_COLOR):
+            return score
+        return -score
+
+
+### Generation ###
+def _signatures(max_pieces: int) -> list[tuple]:
+    # Captures lead to fewer pieces and promotions to fewer men,
+    # so in this order every move out of a table leads to a finished one:
+    signatures = [
+        signature
+        for signature in product(range(max_pieces + 1), repeat=4)
+        if 2 <= sum(signature) <= max_pieces
+        and signature[0] + signature[1] > 0
+        and signature[2] + signature[3] > 0
+    ]
+    return sorted(
+        signatures, key=lambda s: (sum(s), s[0] + s[2], max(s, flip_signature(s)), s)
+    )
+
+
+def _group_placements(group: int, count: int) -> list[tuple[int, int]]:
+    # Every (rank, mask) of count pieces on the allowed squares:
+    placements = []
+    for squares in combinations(_GROUP_SQUARES[group], count):
+        mask = 0
+        for square in squares:
+            mask |= 1 << square
+        placements.append((_group_rank(group, mask), mask))
+    return placements
+
+
+def _positions(signature: tuple):
+    sizes = signature_sizes(signature)
+    groups = [_group_placements(group, count) for group, count in enumerate(signature)]
+    for placement in product(*groups):
+        white_men, white_queens, black_men, black_queens = (
+            mask for _, mask in placement
+        )
+        occupied = white_men | white_queens | black_men | black_queens
+        if occupied.bit_count() != sum(signature):
+            continue
+        index = 0
+        for (rank, _), size in zip(placement, sizes):
+            index = index * size + rank
+        yield (
+            index,
+            white_men | white_queens,
+            black_men | black_queens,
+            white_queens | black_queens,
+        )
+
+
+def generate_component(
+    signatures: list[tuple], forced_jumping: bool, finished: dict
+) -> dict:
+    # Solves the signatures that reach each other with quiet moves
+    # (a signature and its flipped one) by retrograde analysis:
+    offsets = {}
+    total = 0
+    for signature in signatures:
+        offsets[signature] = total
+        total += _table_size(signature)
+
+    remaining = array("i", bytes(4 * total))
+    longest_loss = bytearray(total)
+    can_lose = bytearray(b"\x01") * total
+    edge_parents = array("I")
+    edge_children = array("I")
+    buckets = [[] for _ in range(MAX_DISTANCE + 2)]
+
+    board = Board()
+    for signature in signatures:
+        offset = offsets[signature]
+        for index, white, black, queens in _positions(signature):
+            position = offset + index
+            board.load_bitboards(white, black, queens, WHITE_COLOR)
+            moves = board.calculate_all_turn_moves(WHITE_COLOR, forced_jumping)
+            if not moves:
+                buckets[0].append(position)
+                continue
+
+            shortest_win = None
+            for move in moves:
+                board.make_move(move)
+                # Opponent is to move, so it becomes white in the flipped board:
+                child_white = flip_bitboard(board.black)
+                child_black = flip_bitboard(board.white)
+                child_queens = flip_bitboard(board.queens)
+                board.undo_move(move)
+
+                if not child_white:
+                    # Last piece was taken, opponent has lost right away:
+                    value = 1
+                else:
+                    child_signature = signature_of(
+                        child_white, child_black, child_queens
+                    )
+                    child_index = position_index(
+                        child_white, child_black, child_queens, child_signature
+                    )
+                    if child_signature in offsets:
+                        edge_parents.append(position)
+                        edge_children.append(offsets[child_signature] + child_index)
+                        remaining[position] += 1
+                        continue
+                    value = finished[child_signature][child_index]
+
+                if value == 0:
+                    can_lose[position] = 0
+                elif (value - 1) % 2 == 0:
+                    can_lose[position] = 0
+                    if shortest_win is None or value < shortest_win:
+                        shortest_win = value
+                else:
+                    longest_loss[position] = max(longest_loss[position], value)
+
+            if shortest_win is not None:
+                buckets[shortest_win].append(position)
+            elif remaining[position] == 0 and can_lose[position]:
+                buckets[longest_loss[position]].append(position)
+
+    # Parents of every position, grouped like a compressed sparse row:
+    starts = array("I", bytes(4 * (total + 1)))
+    for child in edge_children:
+        starts[child + 1] += 1
+    for i in range(total):
+        starts[i + 1] += starts[i]
+    parents = array("I", bytes(4 * len(edge_children)))
+    fill = array("I", starts[:-1])
+    for parent, child in zip(edge_parents, edge_children):
+        parents[fill[child]] = parent
+        fill[child] += 1
+    del edge_parents, edge_children, fill
+
+    # Positions are resolved from the shortest distance up, so the winner
+    # takes the shortest way and the loser the longest one:
+    values = bytearray(total)
+    for distance, bucket in enumerate(buckets):
+        for position in bucket:
+            if values[position]:
+                continue
+            values[position] = distance + 1
+            if distance >= MAX_DISTANCE:
+                raise ValueError(f"Distance of {signatures} doesn't fit into a byte")
+            for parent in parents[starts[position] : starts[position + 1]]:
+                if values[parent]:
+                    continue
+                if distance % 2 == 0:
+                    buckets[distance + 1].append(parent)
+                    continue
+                remaining[parent] -= 1
+                longest_loss[parent] = max(longest_loss[parent], distance + 1)
+                if remaining[parent] == 0 and can_lose[parent]:
+                    buckets[longest_loss[parent]].append(parent)
+
+    return {
+        signature: values[offset : offset + _table_size(signature)]
+        for signature, offset in offsets.items()
+    }
+
+
+def _table_size(signature: tuple) -> int:
+    size = 1
+    for group_size in signature_sizes(signature):
+        size *= group_size
+    return size
+
+
+def generate(directory: str, max_pieces: int, forced_modes: list[bool]) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for forced_jumping in forced_modes:
+        finished = {}
+        for signature in _signatures(max_pieces):
+            if signature in finished:
+                continue
+            start_time = time.perf_counter()
+            component = sorted({signature, flip_signature(signature)})
+            finished.update(generate_component(component, forced_jumping, finished))
+
+            for signature in component:
+                values = finished[signature]
+                name = table_name(signature, forced_jumping)
+                path = os.path.join(directory, name)
+                # Table gets its name only when it is complete, an interrupted
+                # run leaves just a temporary file behind:
+                with open(path + ".tmp", "wb") as file:
+                    file.write(
+                        _HEADER.pack(
+                            TABLEBASE_MAGIC,
+                            TABLEBASE_VERSION,
+                            *signature,
+                            forced_jumping,
+                        )
+                    )
+                    file.write(values)
+                os.replace(path + ".tmp", path)
+                wins = sum(1 for value in values if value and value % 2 == 0)
+                losses = sum(1 for value in values if value % 2 == 1)
+                print(
+                    f"{name}: {wins} wins, {losses} losses, longest "
+                    f"{max(values) - 1 if any(values) else 0} plies "
+                    f"({time.perf_counter() - start_time:.1f}s)"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generates endgame tablebases by retrograde analysis."
+    )
+    parser.add_argument(
+        "-n",
+        "--pieces",
+        type=int,
+        default=TABLEBASE_PIECES,
+        help=f"most pieces on the board (default: {TABLEBASE_PIECES})",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=TABLEBASE_DIRECTORY,
+        help=f"directory for the tables (default: {TABLEBASE_DIRECTORY})",
+    )
+    parser.add_argument(
+        "--forced",
+        choices=list(FORCED_JUMPING_MODES),
+        default="both",
+        help="forced jumping rule",
+    )
+    args = parser.parse_args()
+    forced_modes = FORCED_JUMPING_MODES[args.forced]
+    generate(args.output, args.pieces, forced_modes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import struct
+from multiprocessing import shared_memory
+
+from Move import Move
+
+### Bound types ###
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Rough size of one stored entry (tuple, key and score objects):
+ENTRY_BYTES = 160
+
+# Packed entry in shared memory is three 64-bit words,
+# key ^ data ^ move, data and the key of the move (0 if there is none):
+PACKED_ENTRY_WORDS = 3
+PACKED_ENTRY_BYTES = 8 * PACKED_ENTRY_WORDS
+# Data word layout, score is stored as 32-bit float:
+_USED_BIT = 1 << 63
+_DEPTH_SHIFT = 32
+_FLAG_SHIFT = 40
+_SCORE = struct.Struct("<f")
+
+# Entries are tuples, so these are the positions of their fields:
+ENTRY_KEY = 0
+ENTRY_DEPTH = 1
+ENTRY_SCORE = 2
+ENTRY_FLAG = 3
+ENTRY_MOVE = 4
+
+
+class TranspositionTable(object):
+    def __init__(self, memory_bytes: int) -> None:
+        # Every bucket has two slots, first one keeps the deepest search
+        # and the second one is always replaced:
+        buckets = 1
+        while buckets * 4 * ENTRY_BYTES <= memory_bytes:
+            buckets *= 2
+        self._mask: int = buckets - 1
+        self._slots: list = [None] * (2 * buckets)
+        self.clear()
+
+    def __len__(self) -> int:
+        return self._used
+
+    @property
+    def size(self) -> int:
+        return len(self._slots)
+
+    def clear(self) -> None:
+        self._slots[:] = [None] * len(self._slots)
+        self._used = 0
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def probe(self, key: int):
+        self.probes += 1
+        index = 2 * (key & self._mask)
+        slots = self._slots
+        for entry in (slots[index], slots[index + 1]):
+            if entry is None:
+                continue
+            if entry[ENTRY_KEY] == key:
+                self.hits += 1
+                return entry
+        if slots[index] is not None:
+            # Bucket is taken by other positions:
+            self.collisions += 1
+        return None
+
+    def store(
+        self, key: int, depth: int, score: float, flag: int, move: Move = None
+    ) -> None:
+        self.stores += 1
+        index = 2 * (key & self._mask)
+        slots = self._slots
+        entry = (key, depth, score, flag, move)
+
+        deepest = slots[index]
+        if deepest is None:
+            self._used += 1
+            slots[index] = entry
+        elif deepest[ENTRY_KEY] == key or depth >= deepest[ENTRY_DEPTH]:
+            # Keep the best move we knew if the new search found none:
+            if move is None and deepest[ENTRY_KEY] == key:
+                entry = (key, depth, score, flag, deepest[ENTRY_MOVE])
+            slots[index] = entry
+            # Old deep entry still deserves a place in the bucket:
+            if deepest[ENTRY_KEY] != key:
+                if slots[index + 1] is None:
+                    self._used += 1
+                slots[index + 1] = deepest
+            elif slots[index + 1] is not None and slots[index + 1][ENTRY_KEY] == key:
+                self._used -= 1
+                slots[index + 1] = None
+        else:
+            if slots[index + 1] is None:
+                self._used += 1
+            slots[index + 1] = entry
+
+    def stats(self) -> dict:
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "fill": self._used / len(self._slots),
+        }
+
+
+class SharedTranspositionTable(object):
+    # Same interface as TranspositionTable, but entries are packed into
+    # shared memory, so every process attached by name sees them.
+    # There are no locks: key is stored XOR-ed with the rest, so an entry
+    # torn by two processes writing at once simply doesn't match any key.
+    def __init__(self, memory_bytes: int, name: str = None) -> None:
+        buckets = 1
+        while buckets * 4 * PACKED_ENTRY_BYTES <= memory_bytes:
+            buckets *= 2
+        self._mask: int = buckets - 1
+        self._owner = name is None
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=2 * buckets * PACKED_ENTRY_BYTES
+            )
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self._words = self._memory.buf.cast("Q")
+        if self._owner:
+            self.clear()
+        else:
+            self.reset_stats()
+
+    def __len__(self) -> int:
+        data = self._words[1 :: PACKED_ENTRY_WORDS]
+        return sum(1 for word in data if word)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def size(self) -> int:
+        return len(self._words) // PACKED_ENTRY_WORDS
+
+    def close(self) -> None:
+        self._words.release()
+        self._memory.close()
+        # Only the creator removes the memory when it is done:
+        if self._owner:
+            self._memory.unlink()
+
+    def clear(self) -> None:
+        self._memory.buf[:] = bytes(len(self._memory.buf))
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+
+    @staticmethod
+    def _pack(depth: int, score: float, flag: int) -> int:
+        return (
+            _USED_BIT
+            | int.from_bytes(_SCORE.pack(score), "little")
+            | min(depth, 255) << _DEPTH_SHIFT
+            | flag << _FLAG_SHIFT
+        )
+
+    @staticmethod
+    def _unpack(key: int, data: int, move_key: int) -> tuple:
+        return (
+            key,
+            data >> _DEPTH_SHIFT & 255,
+            _SCORE.unpack((data & 0xFFFFFFFF).to_bytes(4, "little"))[0],
+            data >> _FLAG_SHIFT & 3,
+            Move.from_key(move_key) if move_key else None,
+        )
+
+    def probe(self, key: int):
+        self.probes += 1
+        words = self._words
+        index = 2 * PACKED_ENTRY_WORDS * (key & self._mask)
+        occupied = False
+        for slot in (index, index + PACKED_ENTRY_WORDS):
+            data = words[slot + 1]
+            if not data:
+                continue
+            occupied = True
+            move_key = words[slot + 2]
+            if words[slot] ^ data ^ move_key == key:
+                self.hits += 1
+                return self._unpack(key, data, move_key)
+        if occupied:
+            self.collisions += 1
+        return None
+
+    def store(
+        self, key: int, depth: int, score: float, flag: int, move: Move = None
+    ) -> None:
+        self.stores += 1
+        words = self._words
+        index = 2 * PACKED_ENTRY_WORDS * (key & self._mask)
+        data = self._pack(depth, score, flag)
+        move_key = move.key if move is not None else 0
+
+        # Deepest slot is replaced by the same position or a deeper search,
+        # everything else goes to the always replaced slot:
+        deepest = words[index + 1]
+        same_key = words[index] ^ deepest ^ words[index + 2] == key
+        if not deepest or same_key or depth >= deepest >> _DEPTH_SHIFT & 255:
+            slot = index
+            # Keep the best move we knew if the new search found none:
+            if deepest and same_key and move is None:
+                move_key = words[index + 2]
+            # Old deep entry still deserves a place in the bucket:
+            if deepest and not same_key:
+                second = index + PACKED_ENTRY_WORDS
+                words[second : second + PACKED_ENTRY_WORDS] = words[index:second]
+        else:
+            slot = index + PACKED_ENTRY_WORDS
+        words[slot] = key ^ data ^ move_key
+        words[slot + 1] = data
+        words[slot + 2] = move_key
+
+    def stats(self) -> dict:
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "fill": self.sample_fill(),
+        }
+
+    def sample_fill(self, samples: int = 4096) -> float:
+        # Counting the whole shared table is slow, start of it is enough:
+        samples = min(samples, self.size)
+        data = self._words[1 : PACKED_ENTRY_WORDS * samples : PACKED_ENTRY_WORDS]
+        return sum(1 for word in data if word) / samples